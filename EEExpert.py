@@ -42,12 +42,14 @@ class Strategy:
     _log: Logger
     _clock: TimeStamp
 
-    def __init__(self, width: int, log_path: str):
+    def __init__(self, width: int, log_path: str, binary: bool = False, snapshot_every: int = 0, validate: bool = False):
         if width < 34:
             raise ValueError("Not a valid width for this Expert Strategy.")
 
         self._store = Store(width)
-        self._log = Logger(log_path, "ExpertStrategy", width)
+        self._log = Logger(log_path, "ExpertStrategy", width, binary, snapshot_every=snapshot_every)
+        if validate:
+            self._log.attach(ShadowValidator(width))
         self._clock = 0
 
     def cash(self) -> int:
@@ -55,12 +57,23 @@ class Strategy:
 
         return self._store.cash()
 
+    def close(self) -> None:
+        """Closes the log, writing the actions still buffered."""
+
+        self._log.close()
+
     def move_container(self, c: Container, new_p: Position) -> None:
         """Moves a container to a certain position."""
 
         self._store.move(c, new_p)
         self._log.move(self._clock, c, new_p)
 
+    def move_containers(self, p: Position, k: int, new_p: Position) -> None:
+        """Moves the top k containers of a position to a new position, one per time step."""
+
+        moved = self._store.move_stack(p, k, new_p)
+        self._log.moves(self._clock, moved, new_p)
+
     def remove_container(self, c: Container) -> None:
         """Removes a container from the Store."""
 
@@ -91,7 +104,7 @@ class Strategy:
     def container(self, i: int) -> Container:
         """Returns the next container to be treated."""
 
-        return self._store._containers_in_store[i]
+        return self._store.containers()[i]
 
     def treat_container(self, c: Container, new_p: Position) -> None:
         """Treats a certain container and decides whether to move it to a new position
@@ -108,10 +121,10 @@ class Strategy:
     def treat_add_container(self, c: Container) -> None:
         """Treats a new container and adds it to a certain Store column."""
 
-        if c.delivery.end - c.delivery.start < 10:
+        if c.delivery_end - c.delivery_start < 10:
             self.add_container(c, 20 + (c.size*(c.size-1) // 2))
         # amb aquesta comparació ens estalviem afegir-lo a la columna del més prioritari i fer 1 moviment inútil extra
-        elif self.next_comparer(c.size *(c.size - 1)) == None or self.next_comparer(c.size * (c.size - 1)).delivery.start > c.delivery.start:
+        elif self.next_comparer(c.size *(c.size - 1)) == None or self.next_comparer(c.size * (c.size - 1)).delivery_start > c.delivery_start:
             self.add_container(c, c.size * (c.size - 1))
         else:
             self.add_container(c, c.size*c.size)
@@ -119,15 +132,15 @@ class Strategy:
 
 
     def priority_list(self, s: int)-> List[Container]:
-        """Returns a list with the prioritary container for each size."""
+        """Returns a list with the prioritary container for each size. If s is 1, the first
+        container of the store is not taken into account."""
 
         prioritats = [] #type: List[Container]
+        first = self.container(0) if s > 0 else None
         for i in range(1,5):
-            j = s
-            while j < self.size_store() and self.container(j).size != i:
-                j += 1
-            if j < self.size_store():
-                insort_left(prioritats, self.container(j))
+            cont = self._store.first_container(i, first)
+            if cont is not None:
+                insort_left(prioritats, cont)
         return prioritats
 
     def next_comparer(self, p: Position) -> Optional[Container]:
@@ -135,13 +148,44 @@ class Strategy:
 
         return self._store.top_container(p)
 
+    def new_position(self, c: Container, p: Position, first_pile: bool) -> Position:
+        """Returns where a container found over a prioritary one at position p has to be moved.
+        The ones taken from the short delivery columns go to the first or the second pile of their size."""
+
+        if p >= 20 and p < 30:
+            return c.size*(c.size - 1) if first_pile else c.size*c.size
+        elif c.delivery_end - c.delivery_start < 10:
+            return 20 + c.size*(c.size - 1)//2
+        return p + c.size if p in [0,2,6,12] else p - c.size
+
+    def treat_pile(self, p: Position, cont: Container, end: TimeStamp, first_pile: bool) -> None:
+        """Treats the containers over cont at position p until cont is on top or we reach the
+        time end. Consecutive containers that have to be moved to the same position are moved as a block."""
+
+        comparer = self.next_comparer(p)
+        while end > self._clock and comparer != cont and comparer is not None:
+            new_p = self.new_position(comparer, p, first_pile)
+            k = 0
+            for comparer_k in self._store.top_containers(p):
+                if (self._clock + k == end or comparer_k is cont or comparer_k.removable(self._clock + k)
+                        or self.new_position(comparer_k, p, first_pile) != new_p):
+                    break
+                k += 1
+            if k > 1 and self._store.can_move_stack(p, k, new_p):
+                self.move_containers(p, k, new_p)
+                self._clock += k
+            else:
+                self.treat_container(comparer, new_p)
+            comparer = self.next_comparer(p)
+
 
 # avís - aquesta funció està bastant malament implementada, i'm so sorry, si tingués més temps la simplificaria però ara ja em fa massa mandra
     def exec(self, c: Container):
         """Method that is executed every time a container arrives at the store. We
         can execute as many actions as time we have in our arrival TimeRange."""
 
-        self._clock, ending_time = c.arrival.start, c.arrival.end
+        self._log.checkpoint(c.arrival_start, self._store)
+        self._clock, ending_time = c.arrival_start, c.arrival_end
         self.treat_add_container(c)
 
         while ending_time > self._clock and not self.empty_store():
@@ -149,22 +193,14 @@ class Strategy:
             # Pas 2(i) - tractem els contenidors de la pila del contenidor de major prioritat
             cont = self.container(0)
             p = self._store.location(cont)[1]
-            comparer = self.next_comparer(p)
-            while ending_time > self._clock and comparer != cont and comparer is not None:
-                if p >= 20 and p < 30:
-                    self.treat_container(comparer, comparer.size*comparer.size)
-                elif comparer.delivery.end - comparer.delivery.start < 10:
-                    self.treat_container(comparer, 20 + comparer.size*(comparer.size - 1)//2)
-                else:
-                    self.treat_container(comparer, p + comparer.size) if p in [0,2,6,12] else self.treat_container(comparer, p - comparer.size)
-                comparer = self.next_comparer(p)
+            self.treat_pile(p, cont, ending_time, False)
 
             if ending_time > self._clock:
                 # Pas 2(ii) - si el podem tractar el tractem
-                if cont.delivery.start <= self._clock:
+                if cont.delivery_start <= self._clock:
                     self.treat_container(cont, p)
                 else: # el movem a la columna 30 si és necessari (el voldrem tractar més endavant en el nostre interval d'arribada)
-                    if cont.delivery.start < c.arrival.end:
+                    if cont.delivery_start < c.arrival_end:
                         self.move_container(cont, 30)
                         prioritats = self.priority_list(1)
                     else:
@@ -174,18 +210,10 @@ class Strategy:
                         # mateixa estructura que part superior
                         cont_i = prioritats[i]
                         p = self._store.location(cont_i)[1]
-                        comparer = self.next_comparer(p)
-                        while ending_time > self._clock and self._clock != cont.delivery.start and comparer != cont_i and comparer is not None:
-                            if p >= 20 and p < 30:
-                                self.treat_container(comparer, [0,2,6,12][comparer.size - 1])
-                            elif comparer.delivery.end - comparer.delivery.start < 10:
-                                self.treat_container(comparer, 20 + comparer.size*(comparer.size - 1)//2)
-                            else:
-                                self.treat_container(comparer, p + comparer.size) if p in [0,2,6,12] else self.treat_container(comparer, p - comparer.size)
-                            comparer = self.next_comparer(p)
+                        self.treat_pile(p, cont_i, min(ending_time, cont.delivery_start), True)
                     # Pas 2(iii.ii)
-                    if cont.delivery.start >= self._clock and cont.delivery.start < c.arrival.end:
-                        self._clock = cont.delivery.start
+                    if cont.delivery_start >= self._clock and cont.delivery_start < c.arrival_end:
+                        self._clock = cont.delivery_start
                         self.treat_container(cont, 30)
                     else:
                         self._clock = ending_time
@@ -202,13 +230,13 @@ def init_curses():
         curses.init_pair(i + 1, curses.COLOR_WHITE, i)
 
 
-def execute_strategy(containers_path: str, log_path: str, width: int):
-    """Execute the strategy on an empty store of a certain width reading containers from containers_path and logging to log_path."""
+def execute_strategy(containers_path: str, log_path: str, width: int, binary: bool = False, snapshot_every: int = 0,
+                     validate: bool = False):
+    """Execute the strategy on an empty store of a certain width reading containers from containers_path and logging to log_path
+    (in binary format if binary is True, with a snapshot of the store every snapshot_every actions if it is not 0).
+    If validate is True, every action is checked as it is logged and a LogError is raised at the first illegal one."""
 
-    containers = read_containers(containers_path)
-    strategy = Strategy(width, log_path)
-    for container in containers:
-        strategy.exec(container)
+    run_strategy(Strategy(width, log_path, binary, snapshot_every, validate), containers_path)
 
 # per executar el programa amb dades: nom de fitxer dels contenidors (probes),
 # nom del fitxer on es registraran les accions i amplada del magatzem.
@@ -221,6 +249,8 @@ def main(stdscr: curses.window):
     log_path = sys.argv[2]
     width = int(sys.argv[3])
 
+    # comprovem tots els contenidors abans de començar la simulació
+    check_containers(containers_path)
     execute_strategy(containers_path, log_path, width)
     # podem comentar o descomentar per habilitar o deshabilitar la comprovació
     # i visualització
@@ -48,12 +48,14 @@ class Strategy:
     _log: Logger
     _clock: TimeStamp
 
-    def __init__(self, width: int, log_path: str):
+    def __init__(self, width: int, log_path: str, binary: bool = False, snapshot_every: int = 0, validate: bool = False):
         if width < 20:
             raise ValueError("Not a valid width for this Expert Strategy.")
 
         self._store = Store(width)
-        self._log = Logger(log_path, "ExpertStrategy", width)
+        self._log = Logger(log_path, "ExpertStrategy", width, binary, snapshot_every=snapshot_every)
+        if validate:
+            self._log.attach(ShadowValidator(width))
         self._clock = 0
 
     def cash(self) -> int:
@@ -61,12 +63,23 @@ class Strategy:
 
         return self._store.cash()
 
+    def close(self) -> None:
+        """Closes the log, writing the actions still buffered."""
+
+        self._log.close()
+
     def move_container(self, c: Container, new_p: Position) -> None:
         """Moves a container to a certain position."""
 
         self._store.move(c, new_p)
         self._log.move(self._clock, c, new_p)
 
+    def move_containers(self, p: Position, k: int, new_p: Position) -> None:
+        """Moves the top k containers of a position to a new position, one per time step."""
+
+        moved = self._store.move_stack(p, k, new_p)
+        self._log.moves(self._clock, moved, new_p)
+
     def remove_container(self, c: Container) -> None:
         """Removes a container from the Store."""
 
@@ -94,7 +107,7 @@ class Strategy:
     def container(self, i: int) -> Container:
         """Returns the next container to be treated."""
 
-        return self._store._containers_in_store[i]
+        return self._store.containers()[i]
 
     def treat_container(self, c: Container, new_p: Position) -> None:
         """Treats a certain container and decides whether to move it to a new position
@@ -114,62 +127,68 @@ class Strategy:
 
         prioritats = [] # type: List[Container]
         for i in range(1,5):
-            j = 0
-            while j < self._store.size() and self.container(j).size != i:
-                j += 1
-            if j < self._store.size():
-                insort_left(prioritats, self.container(j))
+            cont = self._store.first_container(i)
+            if cont is not None:
+                insort_left(prioritats, cont)
         return prioritats
 
     def next_comparer(self, p: Position) -> Optional[Container]:
         return self._store.top_container(p)
 
+    def treat_pile(self, p: Position, cont: Container, new_p: Position, end: TimeStamp) -> None:
+        """Treats the containers over cont at position p until cont is on top or we reach the
+        time end. Consecutive containers that have to be moved to new_p are moved as a block."""
+
+        comparer = self.next_comparer(p)
+        while self._clock < end and comparer != cont and comparer is not None:
+            k = 0
+            for comparer_k in self._store.top_containers(p):
+                if self._clock + k == end or comparer_k is cont or comparer_k.removable(self._clock + k):
+                    break
+                k += 1
+            if k > 1 and self._store.can_move_stack(p, k, new_p):
+                self.move_containers(p, k, new_p)
+                self._clock += k
+            else:
+                self.treat_container(comparer, new_p)
+            comparer = self.next_comparer(p)
+
     def exec(self, c: Container):
         """Method that is executed every time a container arrives at the store. We
         can execute as many actions as time we have in our arrival TimeRange."""
 
-        self._clock = c.arrival.start
+        self._log.checkpoint(c.arrival_start, self._store)
+        self._clock = c.arrival_start
 
         # PAS 1
         self.add_container(c, c.size * (c.size - 1))
 
-        while self._clock < c.arrival.end and not self.empty_store():
+        while self._clock < c.arrival_end and not self.empty_store():
             # PAS 2(i)
             cont = self.container(0)
             p = self._store.location(cont)[1]
-            comparer = self.next_comparer(p)
-            while self._clock < c.arrival.end and comparer != cont and comparer is not None:
-                if p in [0, 2, 6, 12]:
-                    self.treat_container(comparer, p + cont.size)
-                else:
-                    self.treat_container(comparer, p - cont.size)
-                remaining_time -= 1
-                comparer = self.next_comparer(p)
+            self.treat_pile(p, cont, p + cont.size if p in [0, 2, 6, 12] else p - cont.size, c.arrival_end)
 
             # PAS 2(ii)
-            if self._clock < c.arrival.end:
+            if self._clock < c.arrival_end:
                 # Pas 2(iii.i)
-                if cont.delivery.start > self._clock:
+                if cont.delivery_start > self._clock:
                     # generem la llista amb els contenidors de major prioritat
                     prioritats = self.priority_list()
                     # per cada contenidor, executem l'estratègia exposada
                     for i in range(len(prioritats)):
                         cont_i = prioritats[i]
                         p = self._store.location(cont_i)[1]
-                        comparer = self.next_comparer(p)
                         # mentre es compleixen les condicions anem tractant els contenidors de la pila del contenidor de major prioritat seleccionat
-                        while self._clock < c.arrival.end and self._clock != cont.delivery.start and comparer != cont_i and comparer is not None:
-                            if p in [0, 2, 6, 12]:
-                                self.treat_container(comparer, p + cont_i.size)
-                            else:
-                                self.treat_container(comparer, p - cont_i.size)
-                            comparer = self.next_comparer(p)
+                        # (fins que s'acaba el temps o arriba l'hora d'entregar el contenidor prioritari)
+                        self.treat_pile(p, cont_i, p + cont_i.size if p in [0, 2, 6, 12] else p - cont_i.size,
+                                        min(c.arrival_end, cont.delivery_start))
                     # Pas 2(iii.ii)
-                    if cont.delivery.start >= self._clock and cont.delivery.start < c.arrival.end:
-                        self._clock = cont.delivery.start
+                    if cont.delivery_start >= self._clock and cont.delivery_start < c.arrival_end:
+                        self._clock = cont.delivery_start
                         self.treat_container(cont, 20)
                     else:
-                        self._clock = c.arrival.end
+                        self._clock = c.arrival_end
                 else:
                     self.treat_container(cont, p)
 
@@ -184,13 +203,13 @@ def init_curses():
         curses.init_pair(i + 1, curses.COLOR_WHITE, i)
 
 
-def execute_strategy(containers_path: str, log_path: str, width: int):
-    """Execute the strategy on an empty store of a certain width reading containers from containers_path and logging to log_path."""
+def execute_strategy(containers_path: str, log_path: str, width: int, binary: bool = False, snapshot_every: int = 0,
+                     validate: bool = False):
+    """Execute the strategy on an empty store of a certain width reading containers from containers_path and logging to log_path
+    (in binary format if binary is True, with a snapshot of the store every snapshot_every actions if it is not 0).
+    If validate is True, every action is checked as it is logged and a LogError is raised at the first illegal one."""
 
-    containers = read_containers(containers_path)
-    strategy = Strategy(width, log_path)
-    for container in containers:
-        strategy.exec(container)
+    run_strategy(Strategy(width, log_path, binary, snapshot_every, validate), containers_path)
 
 # per executar el programa amb dades: nom de fitxer dels contenidors (probes),
 # nom del fitxer on es registraran les accions i amplada del magatzem.
@@ -203,6 +222,8 @@ def main(stdscr: curses.window):
     log_path = sys.argv[2]
     width = int(sys.argv[3])
 
+    # comprovem tots els contenidors abans de començar la simulació
+    check_containers(containers_path)
     execute_strategy(containers_path, log_path, width)
     # podem comentar o descomentar per habilitar o deshabilitar la comprovació
     # i visualització
@@ -0,0 +1,466 @@
+import sys
+import curses
+import time
+
+from store import *
+
+"""
+L'estratègia amb cerca no segueix cap regla fixa: a cada instant del seu interval
+d'arribada prova seqüències curtes d'accions sobre el mateix magatzem (amb checkpoint i
+rollback, sense copiar-lo) i executa la primera acció de la millor.
+
+1. Les accions possibles en un instant són:
+    · afegir el contenidor que acaba d'arribar (sempre és la primera acció), a les
+    posicions on tapa menys contenidors que s'hagin de treure abans que ell (comptant tots els
+    de les columnes que tapa, i més com més aviat s'hagin de lliurar),
+    · treure un contenidor que ja es pot lliurar (o que ha caducat, per alliberar lloc),
+    · moure un contenidor que tapa (directament o no) algun dels que es poden lliurar dins de l'interval,
+    · esperar.
+2. Cada estat es puntua amb els diners guanyats més el valor dels contenidors pendents
+(descomptat, perquè valgui més cobrar ara) per la probabilitat de treure'ls a temps: menys com
+més part del temps que els queda costi desenterrar-los i, si ja es poden lliurar, com més a prop
+sigui el final de l'interval. Hi restem el cost de desenterrar-los: els contenidors de sobre (i
+els que hi ha sobre d'aquests) que s'hauran de lliurar més tard que ells. Els estats ja puntuats
+en el mateix interval d'arribada es reconeixen pel hash del magatzem.
+3. La cerca és en feix (beam) de profunditat limitada, amb un pressupost de nodes i de temps
+(0.1 s per defecte) per cada contenidor que arriba. Quan s'acaba, només es treuen els
+contenidors que donen diners.
+4. Si la millor acció és esperar, saltem fins al proper instant en què es pot lliurar algun
+contenidor (o fins al final de l'interval, o fins que calgui començar a desenterrar-ne un).
+5. Si el contenidor que ha arribat no hi cap i només queda el temps just per fer-li lloc, deixem
+de cercar: traiem (o movem fora del seu lloc) els contenidors que hi ha a les columnes on costa
+menys i l'afegim.
+6. Si a un contenidor pendent que dona diners només li queda el temps just per desenterrar-lo
+(amb un marge pels que encara s'hi poden posar a sobre), també deixem de cercar i el desenterrem:
+movem els de sobre on no el tapin (o, si no hi caben enlloc, traiem els que valen menys que ell).
+
+Amb menys de 34 posicions la cerca no troba prou lloc per desenterrar els contenidors a temps
+(ni de vegades per afegir els que arriben), i les estratègies expertes ho fan millor.
+"""
+
+# action: what (ADD, REMOVE, MOVE or WAIT), the container and the position (-1 if it has none)
+Action = Tuple[str, Optional[Container], Position]
+
+
+class Strategy:
+
+    """Implementation of the lookahead strategy."""
+
+    _store: Store
+    _log: Logger
+    _clock: TimeStamp
+    _beam: int                                      # sequences kept at each depth
+    _depth: int                                     # length of the sequences tried
+    _positions: int                                 # positions tried to add or move a container
+    _nodes: int                                     # actions tried per exec
+    _seconds: Optional[float]                       # time per exec (None for no limit)
+    _focus: int                                     # pending containers that are dug out even if they are not due yet
+    _nodes_left: int                                # actions that can still be tried in the current exec
+    _scores: Dict[Tuple[int, int, TimeStamp], float]  # scores of the states met in the current exec, by state hash, cash and time
+    _discount: float                                # weight of the value of a pending container against cash
+    _dig_cost: float                                # cost of each container to take out before a pending one
+    _horizon: int                                   # time before its delivery from which digging a container out costs in full
+    _urgency: int                                   # time left in an open delivery range below which a pending container is at risk
+    _margin: int                                    # time kept to dig out a pending container for the ones that can still be piled on it
+    _events: EventQueue                             # delivery events of the containers that have arrived
+    _own_events: bool                               # whether the events are scheduled here (no simulate) or by simulate
+
+    def __init__(self, width: int, log_path: str, binary: bool = False, snapshot_every: int = 0, validate: bool = False,
+                 beam: int = 3, depth: int = 2, positions: int = 5, nodes: int = 2000, seconds: Optional[float] = 0.1,
+                 focus: int = 8):
+        if width < 34:
+            raise ValueError("Not a valid width for the Lookahead Strategy.")
+
+        self._store = Store(width)
+        self._log = Logger(log_path, "LookaheadStrategy", width, binary, snapshot_every=snapshot_every)
+        if validate:
+            self._log.attach(ShadowValidator(width))
+        self._clock = 0
+        self._beam, self._depth, self._positions = beam, depth, positions
+        self._nodes, self._seconds, self._focus = nodes, seconds, focus
+        self._nodes_left = nodes
+        self._scores = {}
+        self._discount, self._dig_cost = 0.9, 4.0
+        self._horizon, self._urgency, self._margin = 50, 20, 5
+        self._events = EventQueue()
+        self._own_events = True
+
+    def cash(self) -> int:
+        """Returns amount of cash made."""
+
+        return self._store.cash()
+
+    def use_events(self, events: EventQueue) -> None:
+        """Takes the events scheduled by simulate (instead of scheduling its own ones)."""
+
+        self._events = events
+        self._own_events = False
+
+    def close(self) -> None:
+        """Closes the log, writing the actions still buffered."""
+
+        self._log.close()
+
+    def apply(self, a: Action, t: TimeStamp, log: bool) -> None:
+        """Does an action at time t on the store and, if log is True, logs it."""
+
+        what, c, p = a
+        if what == 'ADD':
+            self._store.add(c, p)
+        elif what == 'MOVE':
+            self._store.move(c, p)
+        elif what == 'REMOVE':
+            self._store.remove(c)
+            if c.removable(t) and c.makes_profit(t):
+                self._store.add_cash(c.value)
+        if not log:
+            return
+        if what == 'ADD':
+            self._log.add(t, c, p)
+        elif what == 'MOVE':
+            self._log.move(t, c, p)
+        elif what == 'REMOVE':
+            self._log.remove(t, c)
+            if c.removable(t) and c.makes_profit(t):
+                self._log.cash(t, self.cash())
+
+    def positions(self, c: Container, t: TimeStamp) -> List[Position]:
+        """Returns the best positions to put a container: the ones where it covers fewer live
+        containers that have to leave before it (weighing more the ones that have to leave sooner),
+        then the ones that leave fewer steps between neighbouring columns (so that there is room for
+        the big containers), then the lowest ones."""
+
+        width = self._store.width()
+        ranked = []  # type: List[Tuple[float, int, int, Position]]
+        columns = {}  # type: Dict[Position, List[Tuple[int, float]]]
+        for p in self._store.available_positions(c):
+            # els que queden tapats són tots els de les seves columnes, no només els de dalt
+            covered = {}  # type: Dict[int, float]
+            for q in range(p, p + c.size):
+                found = columns.get(q)
+                if found is None:
+                    found = columns[q] = []
+                    for identifier in self._store.column(q):
+                        if identifier == c.identifier:
+                            break
+                        below = self._store.find(identifier)
+                        if below.delivery_end > t and below.delivery_start < c.delivery_start:
+                            found.append((identifier, min(1.0, self._horizon / max(1, below.delivery_start - t))))
+                covered.update(found)
+            h = self._store.local_height(p)
+            steps = 0
+            for q in (p - 1, p + c.size):
+                if 0 <= q < width:
+                    steps += (self._store.local_height(q) != h + 1) - (self._store.local_height(q) != h)
+            ranked.append((sum(covered.values()), steps, h, p))
+        ranked.sort()
+        return [p for cost, steps, h, p in ranked[:self._positions]]
+
+    def actions(self, t: TimeStamp, end: TimeStamp, arrived: Optional[Container]) -> List[Action]:
+        """Returns the actions worth trying at time t of an arrival range that ends at end. If the
+        container that has arrived is not in the store yet, adding it is the only choice (or taking
+        out any container, if there is no room for it)."""
+
+        if arrived is not None:
+            positions = self.positions(arrived, t)
+            if positions:
+                return [('ADD', arrived, p) for p in positions]
+            # there is no room for it: some container has to be moved or leave, even if it does not make profit
+            removable = self._store.removable_containers()
+            return [('REMOVE', c, -1) for c in removable] + [a for c in removable for a in self.moves(c, t)]
+
+        actions = [('WAIT', None, -1)]  # type: List[Action]
+        for c in self._store.removable_containers():
+            if c.removable(t):
+                actions.append(('REMOVE', c, -1))
+        # the containers over the ones that can be delivered before the end of the range, or
+        # over the first ones to be delivered after it
+        blocking = {}  # type: Dict[int, Container]
+        focus = self._focus
+        for c in self._store.containers():
+            if c.delivery_start >= end:
+                if focus == 0:
+                    break
+                focus -= 1
+            if c.delivery_end > t:
+                for above in self._store.containers_above(c):
+                    if above.delivery_start > c.delivery_start and self._store.can_remove(above):
+                        blocking[above.identifier] = above
+        for c in blocking.values():
+            actions.extend(self.moves(c, t))
+        return actions
+
+    def room(self, c: Container) -> Tuple[List[Container], Position]:
+        """Returns the fewest containers that have to leave a set of columns to make a position for
+        a container (the ones over the lowest of the columns and the ones piled over them), and
+        the position."""
+
+        best = None  # type: Optional[Tuple[List[Container], Position]]
+        for p in range(self._store.width() - c.size + 1):
+            h = min(self._store.local_height(p + i) for i in range(c.size))
+            found = {}  # type: Dict[int, Container]
+            for i in range(c.size):
+                for identifier in self._store.column(p + i)[h:]:
+                    if identifier not in found:
+                        found[identifier] = self._store.find(identifier)
+                        for above in self._store.containers_above(found[identifier]):
+                            found[above.identifier] = above
+            if best is None or len(found) < len(best[0]):
+                best = list(found.values()), p
+        return best
+
+    def make_room(self, c: Container, t: TimeStamp, end: TimeStamp) -> Optional[Action]:
+        """If there is no room for a container that has arrived and only the time to make it is left
+        before the end of its arrival range, returns the next action to make it: moving one of the
+        containers in the way out of the columns it needs (if there is a place that is not in the
+        way too), or else taking it out. Returns None if the search can still choose."""
+
+        if self._store.available_positions(c):
+            return None
+        way, p = self.room(c)
+        if end - t > len(way) + 1:
+            return None
+        ids = {other.identifier for other in way}
+        for other in way:
+            if self._store.can_remove(other):
+                for a in self.moves(other, t):
+                    new_p = a[2]
+                    if ((new_p + other.size <= p or new_p >= p + c.size) and
+                            all(self._store.local_height(new_p + i) == 0 or
+                                self._store.column(new_p + i)[-1] not in ids for i in range(other.size))):
+                        return a
+                return 'REMOVE', other, -1
+        return None
+
+    def moves(self, c: Container, t: TimeStamp) -> List[Action]:
+        """Returns the moves worth trying for a container on top of the store."""
+
+        p = self._store.location(c)[1]
+        # the positions that overlap its own columns are not known to be free until it leaves them
+        return [('MOVE', c, new_p) for new_p in self.positions(c, t) if new_p + c.size <= p or new_p >= p + c.size]
+
+    # Compl: O(1) for a state met before in the same exec, else the one of Store.later_above, plus O(number of containers)
+    def score(self, t: TimeStamp) -> float:
+        """Returns how good the store is at time t: the cash made plus the discounted value of the
+        pending containers, by the chance of delivering them in time (less the more of the time left
+        that digging them out would take and, once their delivery range is open, the closer it is to
+        closing), minus the cost of digging them out (the containers above them that have to be
+        delivered later), which weighs more the sooner they have to be delivered."""
+
+        # el mateix estat surt per camins diferents (esperar i després moure, o al revés) i en
+        # la cerca de l'instant següent
+        key = self._store.state_hash(), self._store.cash(), t
+        score = self._scores.get(key)
+        if score is not None:
+            return score
+        score = float(self._store.cash())
+        later_above = self._store.later_above()
+        for c in self._store.containers():
+            if c.delivery_end <= t:
+                continue
+            dig = later_above[c.identifier]
+            if dig == 0 and c.delivery_start > t:
+                score += self._discount * c.value
+                continue
+            left = c.delivery_end - max(t, c.delivery_start)
+            chance = max(0.0, 1.0 - dig / left)
+            if c.delivery_start <= t:
+                chance *= min(1.0, left / self._urgency)
+            score += self._discount * c.value * chance
+            score -= self._dig_cost * dig * min(1.0, self._horizon / max(1, c.delivery_start - t))
+        self._scores[key] = score
+        return score
+
+    def search(self, t: TimeStamp, end: TimeStamp, arrived: Optional[Container], deadline: float) -> Action:
+        """Returns the first action of the best sequence found by a beam search from time t."""
+
+        best = (float('-inf'), ())  # type: Tuple[float, Tuple[Action, ...]]
+        beam = [()]  # type: List[Tuple[Action, ...]]
+        for d in range(min(self._depth, end - t)):
+            candidates = []  # type: List[Tuple[float, Tuple[Action, ...]]]
+            for sequence in beam:
+                self._store.checkpoint()
+                for i, a in enumerate(sequence):
+                    self.apply(a, t + i, False)
+                pending = arrived if all(a[0] != 'ADD' for a in sequence) else None
+                for a in self.actions(t + d, end, pending):
+                    if self._nodes_left <= 0 or time.perf_counter() > deadline:
+                        break
+                    self._nodes_left -= 1
+                    self._store.checkpoint()
+                    self.apply(a, t + d, False)
+                    candidates.append((self.score(t + d + 1), sequence + (a,)))
+                    self._store.rollback()
+                self._store.rollback()
+            if not candidates:
+                break
+            # the first of equal scores is kept: waiting (tried first) is preferred to a useless action
+            candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+            beam = [sequence for score, sequence in candidates[:self._beam]]
+            if candidates[0][0] > best[0]:
+                best = candidates[0]
+        if best[1]:
+            return best[1][0]
+        return self.greedy(t, arrived)
+
+    def greedy(self, t: TimeStamp, arrived: Optional[Container]) -> Action:
+        """Returns an action without searching: add the container that has arrived (making room
+        for it if needed), or else remove a container that makes profit, or else wait."""
+
+        if arrived is not None:
+            positions = self.positions(arrived, t)
+            if positions:
+                return 'ADD', arrived, positions[0]
+            return 'REMOVE', min(self._store.removable_containers(), key=lambda c: c.value), -1
+        for c in self._store.removable_containers():
+            if c.removable(t) and c.makes_profit(t):
+                return 'REMOVE', c, -1
+        return 'WAIT', None, -1
+
+    def danger(self, t: TimeStamp) -> List[Tuple[TimeStamp, Container, int]]:
+        """Returns the pending containers that make profit, have to be delivered within the horizon and
+        can still be dug out in time, with the last time to start digging them out (keeping a margin
+        for the ones that can still be piled on them) and how many containers are in the way: the most
+        urgent first and, of the same urgency, the most valuable."""
+
+        found = []  # type: List[Tuple[TimeStamp, int, int, Container, int]]
+        for c in self._store.containers():
+            if c.value <= 0 or c.delivery_end <= t or c.delivery_end - t > self._horizon:
+                continue
+            depth = self._store.depth(c)
+            if t + depth < c.delivery_end:
+                found.append((c.delivery_end - 1 - depth - self._margin, -c.value, c.identifier, c, depth))
+        found.sort(key=lambda item: item[:3])
+        return [(start, c, depth) for start, value, identifier, c, depth in found]
+
+    def rescue(self, t: TimeStamp) -> Optional[Action]:
+        """If a pending container that makes profit has only the time to dig it out left (see danger),
+        returns the next action to do it: taking it out if it is on top and can be delivered, or else
+        taking out the highest of the containers in the way if it makes profit, or else moving it where
+        it is not in the way, or else taking it out if it is worth less. Returns None if the search can
+        still choose."""
+
+        for start, c, depth in self.danger(t):
+            if start > t:
+                return None
+            if depth == 0:
+                if c.delivery_start <= t:
+                    return 'REMOVE', c, -1
+                continue
+            way = self._store.containers_above(c)
+            top = way[0]
+            if top.removable(t) and top.makes_profit(t):
+                return 'REMOVE', top, -1
+            ids = {other.identifier for other in way}
+            ids.add(c.identifier)
+            for a in self.moves(top, t):
+                new_p = a[2]
+                if all(self._store.local_height(new_p + i) == 0 or self._store.column(new_p + i)[-1] not in ids
+                       for i in range(top.size)):
+                    return a
+            if top.value < c.value:
+                return 'REMOVE', top, -1
+        return None
+
+    def rescue_time(self, t: TimeStamp, end: TimeStamp) -> TimeStamp:
+        """Returns the first time after t, up to end, when a pending container may have to be dug out
+        or delivered (see rescue)."""
+
+        for start, c, depth in self.danger(t):
+            if depth > 0 or c.delivery_start <= t:
+                return max(t + 1, min(end, start))
+        return end
+
+    # Compl: O(log number of events) per event taken
+    def next_delivery(self, t: TimeStamp, end: TimeStamp, arrived: Optional[Container]) -> TimeStamp:
+        """Returns the first time after t when a container of the store can be delivered, or end.
+        The events before it are taken from the queue, except the arrival of the next container
+        and those of the container that has arrived and is not in the store yet."""
+
+        found = end
+        kept = []  # type: List[Event]
+        while found == end:
+            next_time = self._events.next_time()
+            if next_time is None or next_time >= end:
+                break
+            event = self._events.pop()
+            # l'arribada del següent contenidor (que pot caure dins d'aquest interval) la tracta simulate
+            if event.kind == ARRIVAL:
+                kept.append(event)
+            elif event.kind == DELIVERY_OPEN and event.time > t:
+                c = event.container
+                if self._store.find(c.identifier) is c:
+                    found = event.time
+                elif c is arrived:
+                    kept.append(event)
+        for event in kept:
+            self._events.push(event.time, event.kind, event.container)
+        return found
+
+    def exec(self, c: Container):
+        """Method that is executed every time a container arrives at the store. We
+        can execute as many actions as time we have in our arrival TimeRange."""
+
+        self._log.checkpoint(c.arrival_start, self._store)
+        if self._own_events:
+            self._events.schedule(c)
+        self._clock, end = c.arrival_start, c.arrival_end
+        self._nodes_left = self._nodes
+        self._scores = {}
+        deadline = time.perf_counter() + self._seconds if self._seconds is not None else float('inf')
+        arrived = c  # type: Optional[Container]
+
+        while self._clock < end:
+            a = self.make_room(arrived, self._clock, end) if arrived is not None else self.rescue(self._clock)
+            if a is None:
+                a = self.search(self._clock, end, arrived, deadline)
+            if a[0] == 'WAIT':
+                # no saltem més enllà de l'instant en què potser caldrà desenterrar un contenidor
+                self._clock = self.next_delivery(self._clock, self.rescue_time(self._clock, end), arrived)
+                continue
+            self.apply(a, self._clock, True)
+            self._clock += 1
+            if a[0] == 'ADD':
+                arrived = None
+
+
+def init_curses():
+    """Initializes the curses library to get fancy colors and whatnots."""
+
+    curses.curs_set(0)
+    curses.start_color()
+    curses.use_default_colors()
+    for i in range(0, curses.COLORS):
+        curses.init_pair(i + 1, curses.COLOR_WHITE, i)
+
+
+def execute_strategy(containers_path: str, log_path: str, width: int, binary: bool = False, snapshot_every: int = 0,
+                     validate: bool = False):
+    """Execute the strategy on an empty store of a certain width reading containers from containers_path and logging to log_path
+    (in binary format if binary is True, with a snapshot of the store every snapshot_every actions if it is not 0).
+    If validate is True, every action is checked as it is logged and a LogError is raised at the first illegal one."""
+
+    run_strategy(Strategy(width, log_path, binary, snapshot_every, validate), containers_path)
+
+# per executar el programa amb dades: nom de fitxer dels contenidors (probes),
+# nom del fitxer on es registraran les accions i amplada del magatzem.
+def main(stdscr: curses.window):
+    """main script"""
+
+    init_curses()
+
+    containers_path = sys.argv[1]
+    log_path = sys.argv[2]
+    width = int(sys.argv[3])
+
+    # comprovem tots els contenidors abans de començar la simulació
+    check_containers(containers_path)
+    execute_strategy(containers_path, log_path, width)
+    # podem comentar o descomentar per habilitar o deshabilitar la comprovació
+    # i visualització
+    check_and_show(containers_path, log_path, stdscr)
+
+
+# start main script when program executed
+if __name__ == '__main__':
+    curses.wrapper(main)
@@ -0,0 +1,124 @@
+import argparse
+import csv
+import importlib
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from store import *
+from profiling import Profiler
+
+
+# Compta les accions que registra una estratègia (s'hi connecta com a ShadowValidator).
+class ActionCounter:
+
+    """Sink for a Logger that counts the records logged of each kind."""
+
+    counts: Dict[str, int]
+
+    def __init__(self):
+        self.counts = dict.fromkeys(LOG_ACTIONS, 0)
+
+    def record(self, t: TimeStamp, what: str, args: Tuple[int, ...], c: Optional[Container]) -> None:
+        self.counts[what] += 1
+
+
+def run(strategy: str, containers_path: str, width: int, profile_path: Optional[str] = None) \
+        -> Dict[str, Union[str, int, float, None]]:
+    """Runs the strategy of a module on the containers of a file and a store of a certain width, and returns its results.
+    If profile_path is given, the run is profiled and the profile written there (see Profiler.write)."""
+
+    result = {'strategy': strategy, 'probe': os.path.basename(containers_path), 'width': width}  # type: Dict[str, Union[str, int, float, None]]
+    counter = ActionCounter()
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            # the same path as the main of a strategy module: the probe is checked first (not timed)
+            check_containers(containers_path)
+            start = time.perf_counter()
+            s = importlib.import_module(strategy).Strategy(width, os.path.join(directory, 'log'))
+            s._log.attach(counter)
+            profiler = Profiler() if profile_path is not None else None
+            if profiler is not None:
+                profiler.attach(s)
+            run_strategy(s, containers_path)
+        except Exception as error:
+            result['error'] = f'{type(error).__name__}: {error}'
+            return result
+        result['seconds'] = time.perf_counter() - start
+    if profiler is not None:
+        profiler.write(profile_path)
+    actions = counter.counts['ADD'] + counter.counts['REMOVE'] + counter.counts['MOVE']
+    result['cash'] = s.cash()
+    result['actions'] = actions
+    result['moves_per_container'] = counter.counts['MOVE'] / counter.counts['ADD'] if counter.counts['ADD'] else 0.0
+    # each run has its own process (max_tasks_per_child=1), so this is the peak of the run
+    result['peak_memory_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['error'] = None
+    return result
+
+
+def benchmark(strategies: List[str], probes: List[str], widths: List[int], processes: Optional[int] = None,
+              profiles: Optional[str] = None) -> List[Dict[str, Union[str, int, float, None]]]:
+    """Runs every strategy on every probe file and width with a pool of processes, and returns the results in that order.
+    If profiles is a directory, each run is profiled to a JSON file there named after its strategy, probe and width."""
+
+    jobs = [(strategy, probe, width, None if profiles is None else
+             os.path.join(profiles, f'{strategy}_{os.path.basename(probe)}_{width}.json'))
+            for strategy in strategies for probe in probes for width in widths]
+    with ProcessPoolExecutor(processes, max_tasks_per_child=1) as executor:
+        futures = [executor.submit(run, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+
+# columns of the CSV report of a benchmark
+REPORT_FIELDS = ['strategy', 'probe', 'width', 'cash', 'actions', 'moves_per_container', 'seconds', 'peak_memory_kb',
+                 'error']
+
+
+def write_report(results: List[Dict[str, Union[str, int, float, None]]], path: str,
+                 fields: Optional[List[str]] = None) -> None:
+    """Writes the results to path, as CSV if its extension is .csv and as JSON otherwise.
+    The CSV columns are fields, or every key of the results in the order they appear."""
+
+    if path.endswith('.csv'):
+        if fields is None:
+            fields = list(dict.fromkeys(key for result in results for key in result))
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fields)
+            writer.writeheader()
+            writer.writerows(results)
+    else:
+        with open(path, 'w') as file:
+            json.dump(results, file, indent=1)
+
+
+# per comparar estratègies sense visualitzar-les: directori amb els fitxers dels
+# contenidors (probes), fitxer de l'informe (.json o .csv) i amplades dels magatzems.
+def main():
+    """main script"""
+
+    parser = argparse.ArgumentParser(description="Runs strategies over probe files and store widths.")
+    parser.add_argument('probes', help="directory with the probe files")
+    parser.add_argument('report', help="report file (.json or .csv)")
+    parser.add_argument('widths', type=int, nargs='+', help="widths of the store")
+    parser.add_argument('--strategies', nargs='+', default=['simple', 'Expert', 'EEExpert'],
+                        help="modules with a Strategy class")
+    parser.add_argument('--processes', type=int, default=None, help="number of processes (default: one per CPU)")
+    parser.add_argument('--profile', default=None, help="directory for the profile of each run (off by default)")
+    args = parser.parse_args()
+
+    probes = sorted(os.path.join(args.probes, name) for name in os.listdir(args.probes)
+                    if os.path.isfile(os.path.join(args.probes, name)))
+    results = benchmark(args.strategies, probes, args.widths, args.processes, args.profile)
+    write_report(results, args.report, REPORT_FIELDS)
+    for result in results:
+        print(result['strategy'], result['probe'], result['width'], result['error'] or result['cash'], file=sys.stderr)
+
+
+# start main script when program executed
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+import argparse
+import random
+import sys
+
+from store import *
+
+
+def rebuilt_hash(store: Store) -> int:
+    """Returns the state hash of the store computed from scratch."""
+
+    h = 0
+    for identifier, (row, p) in store._container_location.items():
+        h ^= placement_key(identifier, row, p)
+    return h
+
+
+def state(store: Store) -> tuple:
+    """Returns everything that describes the store, checking first its incremental state hash."""
+
+    if store.state_hash() != rebuilt_hash(store):
+        raise AssertionError("The state hash does not match the containers of the store.")
+    entries = [(e[0], e[1], e[2].identifier) for e in (store._container_entry[i] for i in sorted(store._container_entry))]
+    by_size = {size: list(index) for size, index in store._containers_by_size.items() if len(index)}
+    return (store.placements(), entries, list(store.containers()), by_size, sorted(store._removables),
+            store.cash(), store._added, store.height(),
+            [store.leftmost_position(k) for k in range(1, MAX_SIZE + 1)],
+            [store.lowest_position(k) for k in range(1, MAX_SIZE + 1)],
+            [list(column) for column in store._frame])
+
+
+class RandomOperations:
+    """Random operations on stores: additions, removals, moves and stack moves."""
+
+    _rng: random.Random     # random generator
+    _next: int              # identifier of the next container
+
+    def __init__(self, rng: random.Random):
+
+        self._rng = rng
+        self._next = 0
+
+    def __call__(self, store: Store) -> None:
+        """Does a random operation on the store."""
+
+        rng = self._rng
+        r = rng.random()
+        if r < 0.4 or store.empty():
+            c = Container(self._next, rng.randint(1, MAX_SIZE), 5, TimeRange(0, 1), TimeRange(rng.randint(0, 20), 30))
+            self._next += 1
+            positions = store.available_positions(c)
+            if positions:
+                store.add(c, rng.choice(positions))
+        elif r < 0.6:
+            c = rng.choice(store.removable_containers())
+            store.remove(c)
+            store.add_cash(c.value)
+        elif r < 0.85:
+            c = rng.choice(store.removable_containers())
+            p = store.location(c)[1]
+            # les posicions on es pot moure es miren sense el contenidor
+            store.remove(c)
+            positions = store.available_positions(c)
+            store.add(c, p)
+            store.move(c, rng.choice(positions))
+        else:
+            p = rng.randrange(store.width())
+            for k in range(store.local_height(p), 0, -1):
+                for new_p in range(store.width()):
+                    if store.can_move_stack(p, k, new_p):
+                        store.move_stack(p, k, new_p)
+                        return
+
+
+# Compl: O(trials * steps * (number of containers in the store + width))
+def check(trials: int, width: int, seed: int) -> None:
+    """Does random operations on stores with nested checkpoints and forks (and forks of forks), and checks
+    that a rollback leaves the store as it was at its checkpoint and that a store and its forks do not see
+    each other's changes. Raises an AssertionError with the trial at the first difference."""
+
+    rng = random.Random(seed)
+    operate = RandomOperations(rng)
+    for trial in range(trials):
+        store = Store(width)
+        for i in range(rng.randint(0, 5 * width)):
+            operate(store)
+        saved = []  # type: List[tuple]
+        for step in range(rng.randint(1, 40)):
+            r = rng.random()
+            if r < 0.15:
+                saved.append(state(store))
+                store.checkpoint()
+            elif r < 0.25 and saved:
+                before = saved.pop()
+                store.rollback()
+                if state(store) != before:
+                    raise AssertionError(f"Trial {trial}: the rollback does not restore the store.")
+            elif r < 0.3 and saved:
+                saved.pop()
+                store.commit()
+            elif r < 0.35:
+                before = state(store)
+                fork = store.fork()
+                for i in range(10):
+                    operate(fork)
+                if state(store) != before:
+                    raise AssertionError(f"Trial {trial}: the changes of a fork reach its store.")
+                forked = state(fork)
+                for i in range(10):
+                    operate(store)
+                if state(fork) != forked:
+                    raise AssertionError(f"Trial {trial}: the changes of a store reach its fork.")
+                # a fork of a fork that has copied some of its columns and still shares the others
+                again = fork.fork()
+                for i in range(10):
+                    operate(again)
+                if state(fork) != forked:
+                    raise AssertionError(f"Trial {trial}: the changes of a fork of a fork reach the fork.")
+                forked = state(again)
+                for i in range(10):
+                    operate(fork)
+                if state(again) != forked:
+                    raise AssertionError(f"Trial {trial}: the changes of a fork reach a fork of it.")
+            else:
+                operate(store)
+        while saved:
+            before = saved.pop()
+            store.rollback()
+            if state(store) != before:
+                raise AssertionError(f"Trial {trial}: the rollback does not restore the store.")
+
+
+# per comprovar checkpoint/rollback/commit, fork i state_hash amb operacions aleatòries:
+# opcionalment, el nombre de proves, l'amplada i la llavor.
+def main():
+    """main script"""
+
+    parser = argparse.ArgumentParser(description="Checks checkpoints, rollbacks, forks and state hashes of a Store.")
+    parser.add_argument('--trials', type=int, default=300, help="random trials (default 300)")
+    parser.add_argument('--width', type=int, default=12, help="width of the stores (default 12)")
+    parser.add_argument('--seed', type=int, default=1, help="random seed (default 1)")
+    args = parser.parse_args()
+
+    check(args.trials, args.width, args.seed)
+    print("ok", file=sys.stderr)
+
+
+# start main script when program executed
+if __name__ == '__main__':
+    main()
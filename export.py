@@ -0,0 +1,94 @@
+import argparse
+import json
+
+from store import *
+
+
+def frame_lines(store: Store, caption: str = '', rows: int = 15, color: bool = True) -> List[str]:
+    """Returns the lines of a frame of the store with the layout of Store.write: the caption, the
+    lowest rows of containers, the floor and the cash. With color, the containers have the
+    background color of Store.write as 256-color ANSI escapes."""
+
+    lines = [caption, ''] + [''] * rows
+    for p in range(store.width()):
+        column = store.column(p)
+        for row in range(rows):
+            y = rows - row + 1
+            if row < len(column):
+                c = store.find(column[row])
+                label = (str(c.identifier % 100) if store.location(c)[1] == p else '').ljust(2)
+                if color:
+                    # curses color pair i + 1 has background color i
+                    label = f'\x1b[48;5;{c.identifier * 764351 % 250}m{label}\x1b[0m'
+                lines[y] += label
+            else:
+                lines[y] += '  '
+    return lines + ['—' * 2 * store.width(), '$: ' + str(store.cash())]
+
+
+def export_log(containers_path: str, log_path: str, out_path: str, every: int = 1, interval: Optional[int] = None,
+               fps: float = 20.0, rows: int = 15) -> int:
+    """
+    Replays the log at log_path with the containers at containers_path (raising an exception at the
+    first illegal action, as check_and_show) and writes a frame every every actions, or when interval
+    time units of the log have passed if that comes first, plus the last state. The frames go to
+    out_path as an asciinema cast (version 2) at fps frames per second if it ends in .cast, or as
+    plain text frames separated by form feeds otherwise. Only the store is kept in memory: the
+    frames are written as they are made. Returns the number of frames written.
+    """
+
+    containers = read_container_columns(containers_path)
+    cast = out_path.endswith('.cast')
+    with LogReader(log_path) as log, open(out_path, 'w', encoding='utf-8') as out:
+        store = Store(log.width)
+        if cast:
+            out.write(json.dumps({'version': 2, 'width': 2 * log.width, 'height': rows + 4, 'title': log.name}) + '\n')
+        frames = 0
+
+        def write_frame(caption: str) -> None:
+            nonlocal frames
+            lines = frame_lines(store, caption, rows, cast)
+            if cast:
+                # back to the top left corner and every line cleared to its end
+                data = '\x1b[H' + '\r\n'.join(line + '\x1b[K' for line in lines)
+                out.write(json.dumps([round(frames / fps, 6), 'o', data]) + '\n')
+            else:
+                out.write('\n'.join(lines) + '\n\f\n')
+            frames += 1
+
+        write_frame(log.name)
+        last, pending, last_frame = 0, 0, 0
+        for t, what, args in log:
+            assert t >= last
+            last = t
+            replay(store, t, what, args, containers.find)
+            pending += 1
+            if pending >= every or (interval is not None and t - last_frame >= interval):
+                write_frame(f'{log.name} t: {t}')
+                pending, last_frame = 0, t
+        if pending:
+            write_frame(f'{log.name} t: {last}')
+    return frames
+
+
+# per exportar la reproducció d'un registre sense terminal: nom de fitxer dels
+# contenidors (probes), nom del fitxer amb les accions registrades i fitxer de sortida
+# (.cast per asciinema; si no, fotogrames de text).
+def main():
+    """main script"""
+
+    parser = argparse.ArgumentParser(description="Exports the replay of a log as an asciinema cast or text frames.")
+    parser.add_argument('probes', help="probe file")
+    parser.add_argument('log', help="log file")
+    parser.add_argument('out', help="output file (.cast for asciinema, text frames otherwise)")
+    parser.add_argument('--every', type=int, default=1, help="actions between frames (default 1)")
+    parser.add_argument('--interval', type=int, default=None, help="log time between frames, if it comes first")
+    parser.add_argument('--fps', type=float, default=20.0, help="frames per second of the cast (default 20)")
+    args = parser.parse_args()
+
+    print(export_log(args.probes, args.log, args.out, args.every, args.interval, args.fps), 'frames')
+
+
+# start main script when program executed
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import random
+
+from store import *
+
+
+# Cada contenidor arriba quan acaba l'interval d'arribada de l'anterior, com als
+# fitxers de proves, de manera que el fitxer generat passa check_containers.
+def generate_containers(n: int, seed: int = 0, sizes: Tuple[float, ...] = (2, 2, 1, 1),
+                        values: str = 'uniform', value_min: int = 0, value_max: int = 100,
+                        arrival: Tuple[int, int] = (1, 25), delivery: Tuple[int, int] = (10, 400),
+                        slack: Tuple[int, int] = (0, 600), short_fraction: float = 0.2) -> Iterator[Tuple[int, ...]]:
+    """
+    Yields the fields of n containers one by one. The size is drawn with the weights of sizes
+    (size 1 first), the value uniformly or exponentially (with mean the middle of the range)
+    between value_min and value_max, and the length of the arrival range, the length of the
+    delivery range and the time from the start of the arrival to the start of the delivery
+    (slack) uniformly in their ranges. A short_fraction of the containers has a delivery range
+    shorter than 10 instead. The same seed always yields the same containers.
+    """
+
+    rng = random.Random(seed)
+    population = range(1, len(sizes) + 1)
+    mean = (value_min + value_max) / 2
+    t = 0
+    for identifier in range(n):
+        size = rng.choices(population, sizes)[0]
+        if values == 'uniform':
+            value = rng.randint(value_min, value_max)
+        else:
+            value = min(value_max, value_min + int(rng.expovariate(1 / (mean - value_min or 1))))
+        arrival_start, arrival_end = t, t + rng.randint(*arrival)
+        delivery_start = arrival_start + rng.randint(*slack)
+        if rng.random() < short_fraction:
+            delivery_end = delivery_start + rng.randint(1, 9)
+        else:
+            delivery_end = delivery_start + rng.randint(*delivery)
+        yield identifier, size, value, arrival_start, arrival_end, delivery_start, delivery_end
+        t = arrival_end
+
+
+def write_containers(path: str, containers: Iterator[Tuple[int, ...]], batch: int = 4096) -> None:
+    """Writes the containers to a file at path in the format of read_containers, batch lines at a time."""
+
+    with open(path, 'w') as file:
+        lines = []  # type: List[str]
+        for fields in containers:
+            lines.append(' '.join(map(str, fields)) + '\n')
+            if len(lines) == batch:
+                file.writelines(lines)
+                lines.clear()
+        file.writelines(lines)
+
+
+def _range(text: str) -> Tuple[int, int]:
+    low, high = map(int, text.split(','))
+    if low > high:
+        raise argparse.ArgumentTypeError("The range should be low,high with low <= high.")
+    return low, high
+
+
+# per generar un fitxer de contenidors (probes) gran: nom del fitxer i nombre de contenidors.
+def main():
+    """main script"""
+
+    parser = argparse.ArgumentParser(description="Generates a probe file with random containers.")
+    parser.add_argument('path', help="probe file to write")
+    parser.add_argument('n', type=int, help="number of containers")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sizes', type=lambda text: tuple(map(float, text.split(','))), default=(2, 2, 1, 1),
+                        help="weights of the sizes, from size 1 (default 2,2,1,1)")
+    parser.add_argument('--values', choices=['uniform', 'exponential'], default='uniform')
+    parser.add_argument('--value-range', type=_range, default=(0, 100), help="min,max of the values (default 0,100)")
+    parser.add_argument('--arrival', type=_range, default=(1, 25), help="min,max length of the arrival range (default 1,25)")
+    parser.add_argument('--delivery', type=_range, default=(10, 400),
+                        help="min,max length of the delivery range (default 10,400)")
+    parser.add_argument('--slack', type=_range, default=(0, 600),
+                        help="min,max time from the arrival to the delivery (default 0,600)")
+    parser.add_argument('--short', type=float, default=0.2,
+                        help="fraction of containers with a delivery range shorter than 10 (default 0.2)")
+    args = parser.parse_args()
+
+    if len(args.sizes) > MAX_SIZE:
+        parser.error(f"There are only {MAX_SIZE} sizes.")
+    if args.value_range[0] < 0 or args.arrival[0] < 1 or args.delivery[0] < 0 or args.slack[0] < 0:
+        parser.error("The generated containers would not be valid.")
+
+    write_containers(args.path, generate_containers(
+        args.n, args.seed, args.sizes, args.values, args.value_range[0], args.value_range[1],
+        args.arrival, args.delivery, args.slack, args.short))
+
+
+# start main script when program executed
+if __name__ == '__main__':
+    main()
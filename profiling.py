@@ -0,0 +1,111 @@
+import csv
+import json
+import time
+from collections import Counter
+
+from store import *
+
+
+# Operations of Store counted by a Profiler (the calls the store makes to itself,
+# such as move to remove and add, are counted too).
+STORE_OPERATIONS = ('add', 'remove', 'move', 'move_stack', 'can_add', 'can_remove', 'can_move_stack', 'height',
+                    'first_container', 'removable_containers', 'profitable_containers', 'top_container',
+                    'top_containers', 'location', 'depth', 'containers_above', 'leftmost_position',
+                    'lowest_position', 'available_positions')
+
+# Columns of the timeline of a Profiler, one row per container treated.
+TIMELINE_FIELDS = ['container', 'arrival_start', 'arrival_end', 'seconds', 'actions', 'idle', 'cash', 'containers']
+
+
+# Les estratègies i el magatzem no saben res del Profiler: attach substitueix els
+# mètodes de la instància per versions que mesuren, de manera que si no s'hi
+# connecta cap Profiler el codi que s'executa és exactament el de sempre.
+class Profiler:
+
+    """Counts and times what a strategy and its store do, container by container."""
+
+    operations: Counter                             # calls to each operation of the store
+    moves: Counter                                  # moves of each container (by identifier)
+    timeline: List[Dict[str, Union[int, float]]]    # one row per container treated (see TIMELINE_FIELDS)
+    _actions: int                                   # ADD, REMOVE and MOVE records of the current container
+
+    def __init__(self):
+        self.operations = Counter()
+        self.moves = Counter()
+        self.timeline = []
+        self._actions = 0
+
+    def attach(self, strategy) -> None:
+        """Profiles a strategy (with _store, _log and exec) from now on."""
+
+        store = strategy._store
+        for name in STORE_OPERATIONS:
+            setattr(store, name, self._counted(name, getattr(store, name)))
+        strategy._log.attach(self)
+        execute = strategy.exec
+
+        def exec(c: Container):
+            self._actions = 0
+            start = time.perf_counter()
+            execute(c)
+            seconds = time.perf_counter() - start
+            self.timeline.append({
+                'container': c.identifier, 'arrival_start': c.arrival_start, 'arrival_end': c.arrival_end,
+                'seconds': seconds, 'actions': self._actions,
+                # every action takes a time step of the arrival range, the rest are skipped
+                'idle': max(0, c.arrival_end - c.arrival_start - self._actions),
+                'cash': store.cash(), 'containers': store.size()})
+
+        strategy.exec = exec
+
+    def _counted(self, name: str, operation: Callable) -> Callable:
+        operations = self.operations
+
+        def counted(*args, **kwargs):
+            operations[name] += 1
+            return operation(*args, **kwargs)
+
+        return counted
+
+    def record(self, t: TimeStamp, what: str, args: Tuple[int, ...], c: Optional[Container]) -> None:
+        """Receives the records of the log of the strategy."""
+
+        if what == 'MOVE':
+            self.moves[args[0]] += 1
+        if what in ('ADD', 'REMOVE', 'MOVE'):
+            self._actions += 1
+
+    def summary(self) -> Dict[str, Union[int, float, Dict[str, int]]]:
+        """Returns the totals of the run."""
+
+        treated = len(self.timeline)
+        seconds = sum(row['seconds'] for row in self.timeline)
+        span = self.timeline[-1]['arrival_end'] - self.timeline[0]['arrival_start'] if treated else 0
+        cash = self.timeline[-1]['cash'] if treated else 0
+        return {
+            'containers': treated,
+            'seconds': seconds,
+            'seconds_per_exec': seconds / treated if treated else 0.0,
+            'actions': sum(row['actions'] for row in self.timeline),
+            'idle': sum(row['idle'] for row in self.timeline),
+            'moves': sum(self.moves.values()),
+            'moves_per_container': sum(self.moves.values()) / treated if treated else 0.0,
+            'max_moves': max(self.moves.values(), default=0),
+            'cash': cash,
+            'cash_per_time': cash / span if span else 0.0,
+            'max_containers': max((row['containers'] for row in self.timeline), default=0),
+            'operations': dict(self.operations),
+        }
+
+    def write(self, path: str) -> None:
+        """Writes the timeline to path as CSV if its extension is .csv, or the summary,
+        the moves of each container and the timeline as JSON otherwise."""
+
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as file:
+                writer = csv.DictWriter(file, TIMELINE_FIELDS)
+                writer.writeheader()
+                writer.writerows(self.timeline)
+        else:
+            with open(path, 'w') as file:
+                json.dump({'summary': self.summary(), 'moves': self.moves, 'timeline': self.timeline}, file)
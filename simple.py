@@ -11,18 +11,25 @@ class Strategy:
     _store: Store
     _log: Logger
 
-    def __init__(self, width: int, log_path: str):
+    def __init__(self, width: int, log_path: str, binary: bool = False, snapshot_every: int = 0, validate: bool = False):
         if width < 20:
             raise ValueError("Not a valid width for the Simple Strategy.")
 
         self._store = Store(width)
-        self._log = Logger(log_path, "SimpleStrategy", width)
+        self._log = Logger(log_path, "SimpleStrategy", width, binary, snapshot_every=snapshot_every)
+        if validate:
+            self._log.attach(ShadowValidator(width))
 
     def cash(self) -> int:
         """Returns amount of cash made."""
 
         return self._store.cash()
 
+    def close(self) -> None:
+        """Closes the log, writing the actions still buffered."""
+
+        self._log.close()
+
     def move_container(self, c: Container, new_p: Position, t: TimeStamp) -> None:
         """Moves a container to a certain position."""
 
@@ -77,7 +84,8 @@ class Strategy:
         """Method that is executed every time a container arrives at the store. We
         can execute as many actions as time we have in our arrival TimeRange."""
 
-        current_time, ending_time = c.arrival.start, c.arrival.end
+        self._log.checkpoint(c.arrival_start, self._store)
+        current_time, ending_time = c.arrival_start, c.arrival_end
 
         self.add_container(c, c.size * (c.size - 1), current_time)
         current_time += 1
@@ -104,13 +112,13 @@ def init_curses():
         curses.init_pair(i + 1, curses.COLOR_WHITE, i)
 
 
-def execute_strategy(containers_path: str, log_path: str, width: int):
-    """Execute the strategy on an empty store of a certain width reading containers from containers_path and logging to log_path."""
+def execute_strategy(containers_path: str, log_path: str, width: int, binary: bool = False, snapshot_every: int = 0,
+                     validate: bool = False):
+    """Execute the strategy on an empty store of a certain width reading containers from containers_path and logging to log_path
+    (in binary format if binary is True, with a snapshot of the store every snapshot_every actions if it is not 0).
+    If validate is True, every action is checked as it is logged and a LogError is raised at the first illegal one."""
 
-    containers = read_containers(containers_path)
-    strategy = Strategy(width, log_path)
-    for container in containers:
-        strategy.exec(container)
+    run_strategy(Strategy(width, log_path, binary, snapshot_every, validate), containers_path)
 
 # per executar el programa amb dades: nom de fitxer dels contenidors (probes),
 # nom del fitxer on es registraran les accions i amplada del magatzem.
@@ -123,6 +131,8 @@ def main(stdscr: curses.window):
     log_path = sys.argv[2]
     width = int(sys.argv[3])
 
+    # comprovem tots els contenidors abans de començar la simulació
+    check_containers(containers_path)
     execute_strategy(containers_path, log_path, width)
     # podem comentar o descomentar per habilitar o deshabilitar la comprovació
     # i visualització
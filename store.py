@@ -1,8 +1,15 @@
-from dataclasses import dataclass
-from typing import Optional, TextIO, List, Tuple, Dict
+from typing import Optional, List, Tuple, Dict, Set, Iterator, NamedTuple, Union, BinaryIO, TextIO, Callable
 import curses
 import time
-from bisect import insort_left
+from bisect import bisect_left, insort_left
+from array import array
+from struct import Struct
+from concurrent.futures import ProcessPoolExecutor
+import mmap
+import os
+import operator
+import heapq
+from itertools import compress, count, repeat
 
 
 # represents a moment in time.
@@ -14,62 +21,455 @@ Position = int
 # location of container in the store, row and column (Position)
 Location = Tuple[int, int]
 
+# maximum size of a container
+MAX_SIZE = 4
+
+MASK_64 = (1 << 64) - 1
+
+# identifiers and times are kept in 32 bits: in the columns of a store and in the binary log
+INT32_MIN, INT32_MAX = -(1 << 31), (1 << 31) - 1
+
+
+# Compl: O(1)
+def placement_key(identifier: int, row: int, p: Position) -> int:
+    """Returns a pseudo-random 64-bit key for a container placed at a certain row and column
+    (the hash of the three values, which mixes them in C and does not depend on the process)."""
+
+    return hash((identifier, row, p)) & MASK_64
+
 # Time interval between two Timestamps. 'End' not included.
-@dataclass
-class TimeRange:
+class TimeRange(NamedTuple):
     start: TimeStamp
     end: TimeStamp
 
 # Represents a container (identifier, width, price, arrival period
-# and delivery period)
-@dataclass
+# and delivery period). The periods are kept flattened in the container
+# (arrival_start, arrival_end, delivery_start, delivery_end), and the
+# arrival and delivery TimeRanges are built when asked for. Containers
+# are compared and hashed by identity: each one is a different object.
 class Container:
+
+    __slots__ = ('identifier', 'size', 'value', 'arrival_start', 'arrival_end', 'delivery_start', 'delivery_end')
+
     identifier: int
     size: int
     value: int
-    arrival: TimeRange
-    delivery: TimeRange
+    arrival_start: TimeStamp
+    arrival_end: TimeStamp
+    delivery_start: TimeStamp
+    delivery_end: TimeStamp
+
+    def __init__(self, identifier: int, size: int, value: int, arrival: TimeRange, delivery: TimeRange):
+        self.identifier = identifier
+        self.size = size
+        self.value = value
+        self.arrival_start, self.arrival_end = arrival
+        self.delivery_start, self.delivery_end = delivery
+
+    def __repr__(self) -> str:
+        return f'Container(identifier={self.identifier}, size={self.size}, value={self.value}, ' \
+               f'arrival={self.arrival}, delivery={self.delivery})'
+
+    @property
+    def arrival(self) -> TimeRange:
+        return TimeRange(self.arrival_start, self.arrival_end)
+
+    @property
+    def delivery(self) -> TimeRange:
+        return TimeRange(self.delivery_start, self.delivery_end)
 
     def removable(self, t: TimeStamp) -> bool:
         """Returns whether the container can be removed at a certain time."""
 
-        return self.delivery.start <= t
+        return self.delivery_start <= t
 
     def makes_profit(self, t: TimeStamp) -> bool:
         """Assuming a container is removable, returns whether it generates profit at a certain time."""
 
-        return self.delivery.end > t
+        return self.delivery_end > t
 
     def __lt__(self, other) -> bool:
         """Used to compare two containers (done by delivery time)."""
 
-        return self.delivery.start < other.delivery.start
+        return self.delivery_start < other.delivery_start
 
     # We are not going to use this function but we have it in case someone wanted to check
     def valid_container(self) -> bool:
         """Used to check if a container is valid for a certain Store."""
 
-        if self.size <= 0 or self.size > 4:
+        if self.size <= 0 or self.size > MAX_SIZE:
             return False
         if self.value < 0:
             return False
-        if self.arrival.start > self.arrival.end:
+        if self.arrival_start > self.arrival_end:
             return False
-        if self.delivery.start > self.delivery.end:
+        if self.delivery_start > self.delivery_end:
             return False
-        if self.delivery.end < self.arrival.start:
+        if self.delivery_end < self.arrival_start:
             return False
         return True
 
 
+# Entry of the ordered index of containers: delivery start, insertion order
+# (negated, so that among containers with the same delivery start the last
+# one added comes first, as insort_left did) and the container itself.
+Entry = Tuple[TimeStamp, int, Container]
+
+# Ordered collection of containers split in sorted buckets of bounded length.
+# Looking for a bucket is a bisection over the last entry of each bucket, and
+# inserting or deleting inside a bucket only shifts a bounded number of items,
+# so add and remove are O(log n) and the first container is O(1).
+class SortedIndex:
+
+    """Containers ordered by (delivery start, insertion order)."""
+
+    _load: int = 256                                # a bucket is split when it reaches twice this length
+    _buckets: List[List[Entry]]                     # sorted buckets, every entry of a bucket precedes the next bucket
+    _maxes: List[Entry]                             # last entry of each bucket
+    _len: int                                       # number of entries
+
+    def __init__(self):
+        self._buckets = []
+        self._maxes = []
+        self._len = 0
+
+    # Compl: O(1)
+    def __len__(self) -> int:
+        return self._len
+
+    # Compl: O(n)
+    def __iter__(self) -> Iterator[Container]:
+        for bucket in self._buckets:
+            for entry in bucket:
+                yield entry[2]
+
+    # Compl: O(i / load + number of buckets)
+    def __getitem__(self, i: int) -> Container:
+        if i < 0:
+            i += self._len
+        if i < 0 or i >= self._len:
+            raise IndexError("SortedIndex index out of range")
+        for bucket in self._buckets:
+            if i < len(bucket):
+                return bucket[i][2]
+            i -= len(bucket)
+        raise IndexError("SortedIndex index out of range")
+
+    # Compl: O(1)
+    def first(self) -> Optional[Container]:
+        """Returns the first container of the index, if any."""
+
+        return self._buckets[0][0][2] if self._len > 0 else None
+
+    # Compl: O(log n)
+    def add(self, entry: Entry) -> None:
+        """Inserts an entry keeping the order."""
+
+        if not self._buckets:
+            self._buckets.append([entry])
+            self._maxes.append(entry)
+        else:
+            i = bisect_left(self._maxes, entry)
+            if i == len(self._maxes):
+                i -= 1
+                self._buckets[i].append(entry)
+                self._maxes[i] = entry
+            else:
+                insort_left(self._buckets[i], entry)
+            bucket = self._buckets[i]
+            if len(bucket) >= 2 * self._load:
+                self._buckets.insert(i + 1, bucket[self._load:])
+                del bucket[self._load:]
+                self._maxes.insert(i, bucket[-1])
+        self._len += 1
+
+    # Compl: O(log n)
+    # Pre: entry is in the index.
+    def remove(self, entry: Entry) -> None:
+        """Deletes an entry from the index."""
+
+        i = bisect_left(self._maxes, entry)
+        bucket = self._buckets[i]
+        j = bisect_left(bucket, entry)
+        del bucket[j]
+        if not bucket:
+            del self._buckets[i]
+            del self._maxes[i]
+        elif j == len(bucket):
+            self._maxes[i] = bucket[-1]
+        self._len -= 1
+
+    # Compl: O(n / load) buckets copied
+    def copy(self) -> 'SortedIndex':
+        """Returns an independent index with the same entries."""
+
+        index = SortedIndex()
+        index._buckets = [bucket[:] for bucket in self._buckets]
+        index._maxes = self._maxes[:]
+        index._len = self._len
+        return index
+
+
+# a window of columns that does not exist (greater than any height * width + position)
+NO_WINDOW = 1 << 64
+
+# Segment tree over the heights of the columns of a store, whose leaves are blocks
+# of consecutive columns. Each node keeps, in flat lists indexed by node, the height
+# and the length of the run of columns of equal height at each end of its range and,
+# for each size k, the lowest window of k adjacent columns of equal height (as
+# height * width + position, so that the lowest and leftmost one is the minimum) and
+# the leftmost one. A window that crosses the middle of a node lies in the runs at
+# the ends of its children, so a merge is O(MAX_SIZE). Updates are recorded and the
+# tree is brought up to date on the next query: each changed block is summarized with
+# a few passes over its heights at C speed, and then its ancestors are merged.
+class HeightTree:
+
+    """Placement queries over the heights of the columns of a store."""
+
+    _block: int = 32                                # columns of each leaf
+    _width: int                                     # number of columns
+    _leaves: int                                    # number of leaves (a power of two), node i has children 2i and 2i + 1
+    _heights: List[int]                             # height of each column
+    _counts: List[int]                              # number of columns of each height
+    _max: int                                       # height of the highest column
+    _first: List[Position]                          # first column of each node
+    _span: List[int]                                # number of columns of each node (0 past the last column)
+    _start_height: List[int]                        # height of the first column of each node (-1 if it has none)
+    _start_run: List[int]                           # columns of the same height at the start of each node
+    _end_height: List[int]                          # height of the last column of each node (-1 if it has none)
+    _end_run: List[int]                             # columns of the same height at the end of each node
+    _lowest: List[List[int]]                        # for each size k, at k - 1: lowest window of each node (or NO_WINDOW)
+    _leftmost: List[List[int]]                      # for each size k, at k - 1: leftmost window of each node (or NO_WINDOW)
+    _dirty: Optional[Set[int]]                      # blocks changed since the last query (None before the first one)
+
+    def __init__(self, width: int):
+        self._width = width
+        self._leaves = 1
+        while self._leaves * self._block < width:
+            self._leaves *= 2
+        self._heights = [0] * width
+        self._counts = [width]
+        self._max = 0
+        self._dirty = None
+
+    # Compl: O(width)
+    def copy(self) -> 'HeightTree':
+        """Returns an independent tree with the same heights."""
+
+        tree = HeightTree.__new__(HeightTree)
+        tree._width, tree._leaves = self._width, self._leaves
+        tree._heights, tree._counts, tree._max = self._heights[:], self._counts[:], self._max
+        tree._dirty = None if self._dirty is None else set(self._dirty)
+        if self._dirty is not None:
+            tree._first, tree._span = self._first, self._span  # they never change
+            tree._start_height, tree._start_run = self._start_height[:], self._start_run[:]
+            tree._end_height, tree._end_run = self._end_height[:], self._end_run[:]
+            tree._lowest = [nodes[:] for nodes in self._lowest]
+            tree._leftmost = [nodes[:] for nodes in self._leftmost]
+        return tree
+
+    # Compl: O(k), plus the heights left empty when the highest column goes down
+    def update(self, p: Position, k: int, h: int) -> None:
+        """Sets the height of the k columns starting at p."""
+
+        counts, heights = self._counts, self._heights
+        if h >= len(counts):
+            counts.extend([0] * (h + 1 - len(counts)))
+        for old in heights[p:p + k]:
+            counts[old] -= 1
+        counts[h] += k
+        heights[p:p + k] = [h] * k
+        # a store that never asks for positions does not pay for the tree
+        if self._dirty is not None:
+            self._dirty.add(p // self._block)
+            self._dirty.add((p + k - 1) // self._block)
+        # the maximum is kept up to date, so that the height never waits for the tree
+        if h > self._max:
+            self._max = h
+        while counts[self._max] == 0:
+            self._max -= 1
+
+    @staticmethod
+    def _windows(equal: bytes) -> Iterator[bytes]:
+        """Given a byte for each column that is 1 if it is as high as the next one, yields for each
+        size k from 2 a byte for each column that is 1 if the k columns from it are equally high."""
+
+        # each byte of an integer is a column, so that a shift and an and check the next ones at C speed
+        lanes = windows = int.from_bytes(equal, 'little')
+        for k in range(2, MAX_SIZE + 1):
+            windows &= lanes >> 8 * (k - 2)
+            yield windows.to_bytes(len(equal), 'little')
+
+    # Compl: O(block), at C speed
+    def _summarize(self, b: int) -> None:
+        """Computes the leaf of the bth block from the heights of its columns."""
+
+        i = self._leaves + b
+        first = b * self._block
+        heights = self._heights[first:first + self._block]
+        if not heights:
+            self._start_height[i] = self._end_height[i] = -1
+            self._start_run[i] = self._end_run[i] = 0
+            for k in range(MAX_SIZE):
+                self._lowest[k][i] = self._leftmost[k][i] = NO_WINDOW
+            return
+        width, lowest, leftmost = self._width, self._lowest, self._leftmost
+        h = min(heights)
+        lowest[0][i], leftmost[0][i] = h * width + first + heights.index(h), first
+        equal = bytes(map(operator.eq, heights, heights[1:]))
+        for k, windows in enumerate(self._windows(equal), 1):
+            j = windows.find(1)
+            if j < 0:
+                lowest[k][i] = leftmost[k][i] = NO_WINDOW
+                continue
+            leftmost[k][i] = first + j
+            # the leftmost of the windows of the lowest height
+            h = min(compress(heights, windows))
+            j = heights.index(h, j)
+            while not windows[j]:
+                j = heights.index(h, j + 1)
+            lowest[k][i] = h * width + first + j
+        self._start_height[i], self._end_height[i] = heights[0], heights[-1]
+        if 0 in equal:
+            self._start_run[i] = equal.index(0) + 1
+            self._end_run[i] = len(equal) - equal.rindex(0)
+        else:
+            self._start_run[i] = self._end_run[i] = len(heights)
+
+    # Compl: O(MAX_SIZE)
+    def _merge(self, i: int) -> None:
+        """Computes node i from its children."""
+
+        left, right = 2 * i, 2 * i + 1
+        h = self._end_height[left]
+        same = h == self._start_height[right]
+        self._start_height[i], self._end_height[i] = self._start_height[left], self._end_height[right]
+        start_run, end_run, span = self._start_run, self._end_run, self._span
+        start_run[i] = start_run[left] + start_run[right] if same and start_run[left] == span[left] else start_run[left]
+        end_run[i] = end_run[right] + end_run[left] if same and end_run[right] == span[right] else end_run[right]
+        # the windows that cross the middle lie in the runs at the ends of the children
+        before, run = end_run[left], end_run[left] + start_run[right] if same else 0
+        middle = self._first[right]
+        for k in range(MAX_SIZE):
+            lowest, leftmost = self._lowest[k], self._leftmost[k]
+            low, first = lowest[left], leftmost[left]
+            if lowest[right] < low:
+                low = lowest[right]
+            if 0 < k < run:
+                # k + 1 columns, the leftmost of the crossing ones
+                p = middle - before if before < k else middle - k
+                if h * self._width + p < low:
+                    low = h * self._width + p
+                if first == NO_WINDOW:
+                    first = p
+            lowest[i] = low
+            leftmost[i] = first if first != NO_WINDOW else leftmost[right]
+
+    # Compl: O(block + log width) per block changed since the last query, O(width) the first time
+    def _update_tree(self) -> None:
+        if self._dirty is None:
+            nodes = 2 * self._leaves
+            self._first, self._span = [0] * nodes, [0] * nodes
+            for b in range(self._leaves):
+                self._first[self._leaves + b] = b * self._block
+                self._span[self._leaves + b] = max(0, min(self._block, self._width - b * self._block))
+            for i in range(self._leaves - 1, 0, -1):
+                self._first[i], self._span[i] = self._first[2 * i], self._span[2 * i] + self._span[2 * i + 1]
+            self._start_height, self._start_run = [0] * nodes, [0] * nodes
+            self._end_height, self._end_run = [0] * nodes, [0] * nodes
+            self._lowest = [[NO_WINDOW] * nodes for k in range(MAX_SIZE)]
+            self._leftmost = [[NO_WINDOW] * nodes for k in range(MAX_SIZE)]
+            for b in range(self._leaves):
+                self._summarize(b)
+            for i in range(self._leaves - 1, 0, -1):
+                self._merge(i)
+            self._dirty = set()
+        elif self._dirty:
+            level = set()
+            for b in self._dirty:
+                self._summarize(b)
+                level.add((self._leaves + b) // 2)
+            self._dirty = set()
+            level.discard(0)
+            while level:
+                parents = set()
+                for i in level:
+                    self._merge(i)
+                    parents.add(i // 2)
+                parents.discard(0)
+                level = parents
+
+    # Compl: O(1)
+    def max_height(self) -> int:
+        """Returns the height of the highest column."""
+
+        return self._max
+
+    def leftmost(self, k: int) -> Optional[Position]:
+        """Returns the leftmost position with k adjacent columns of equal height."""
+
+        self._update_tree()
+        p = self._leftmost[k - 1][1]
+        return None if p == NO_WINDOW else p
+
+    def lowest(self, k: int) -> Optional[Position]:
+        """Returns the leftmost of the lowest positions with k adjacent columns of equal height."""
+
+        self._update_tree()
+        window = self._lowest[k - 1][1]
+        return None if window == NO_WINDOW else window % self._width
+
+    # Compl: O((m + 1) log width + block), where m is the number of positions found
+    def positions(self, k: int) -> List[Position]:
+        """Returns, from left to right, all the positions with k adjacent columns of equal height."""
+
+        self._update_tree()
+        found = []  # type: List[Position]
+        self._collect(1, k, found)
+        return found
+
+    def _collect(self, i: int, k: int, found: List[Position]) -> None:
+        if self._leftmost[k - 1][i] == NO_WINDOW:
+            return
+        if i >= self._leaves:
+            first = self._first[i]
+            heights = self._heights[first:first + self._block]
+            if k == 1:
+                found.extend(range(first, first + len(heights)))
+            else:
+                windows = self._windows(bytes(map(operator.eq, heights, heights[1:])))
+                for size in range(2, k):
+                    next(windows)
+                found.extend(compress(count(first), next(windows)))
+            return
+        left, right = 2 * i, 2 * i + 1
+        self._collect(left, k, found)
+        if k > 1 and self._end_height[left] == self._start_height[right]:
+            middle = self._first[right]
+            found.extend(range(max(middle - self._end_run[left], middle - k + 1),
+                               min(middle, middle + self._start_run[right] - k + 1)))
+        self._collect(right, k, found)
+
+
 # Store has no knowledge of time
 class Store:
 
     _width: int                                     # width of the store
     _cash: int                                      # cash generated
-    _frame: List[List[Container]]                   # matrix that represents the store
+    _frame: List[array]                             # matrix that represents the store, with the identifiers of the containers in each column
+    _containers: Dict[int, Container]               # container of each identifier in the store
     _container_location: Dict[int, Location]        # contains the location of each container in the store
-    _containers_in_store: List[Container]           # ordered list of containers in store, useful for expert strategies
+    _heights: HeightTree                            # placement queries over the height of each column
+    _removables: Dict[int, Container]               # containers that are on top of every column they cover
+    _containers_in_store: SortedIndex               # ordered containers in store, useful for expert strategies
+    _containers_by_size: Dict[int, SortedIndex]     # ordered containers in store of each size
+    _container_entry: Dict[int, Entry]              # entry of each container in _containers_in_store
+    _added: int                                     # number of additions so far, used to break ties in the order
+    _journal: Optional[List[tuple]]                 # operations done since the first open checkpoint (None if there is none)
+    _checkpoints: List[Tuple[int, int, int]]        # length of the journal, _added and cash at each open checkpoint
+    _shared: bool                                   # the structures may be shared with a fork, copy them before changing them
+    _owned: Optional[Set[int]]                      # columns of _frame copied since the last fork (None if they are all own)
+    _hash: int                                      # xor of the placement_key of every container in the store, before the mask
 
     def __init__(self, width: int):
 
@@ -78,9 +478,20 @@ class Store:
 
         self._width = width
         self._cash = 0
-        self._frame = [[] for i in range(width)]
+        self._frame = [array('i') for i in range(width)]
+        self._containers = {}
         self._container_location = {}
-        self._containers_in_store = []
+        self._heights = HeightTree(width)
+        self._removables = {}
+        self._containers_in_store = SortedIndex()
+        self._containers_by_size = {}
+        self._container_entry = {}
+        self._added = 0
+        self._journal = None
+        self._checkpoints = []
+        self._shared = False
+        self._owned = None
+        self._hash = 0
 
     # Compl: O(1)
     def width(self) -> int:
@@ -92,25 +503,22 @@ class Store:
     def local_height(self, p: Position) -> int:
         """Returns the height of a certain column of the Store"""
 
-        if p < 0 or p >= self.width():
+        if p < 0 or p >= self._width:
             raise ValueError(p, "not a valid position.")
 
         return len(self._frame[p])
 
-    # Compl: O(width)
+    # Compl: O(1)
     def height(self) -> int:
         """Returns the height of the Store."""
 
-        h = 0
-        for i in range(self.width()):
-            h = max(self.local_height(i), h)
-        return h
+        return self._heights.max_height()
 
     # Compl: O(1)
     def size(self) -> int:
         """Returns the number of containers in the Store."""
 
-        return len(self.containers())
+        return len(self._container_location)
 
     # Compl: O(1)
     def empty(self) -> bool:
@@ -130,109 +538,470 @@ class Store:
 
         self._cash += amount
 
-    # Compl: O(number of containers in the store). Adding to a sorted list has running time of O(n).
+    # Compl: O(log(number of containers in the store)). Adding to the ordered index.
     # Pre: c is a valid Container.
     def add(self, c: Container, p: Position) -> None:
         """Adds a container to a certain position."""
 
-        if c.identifier in self._container_location.keys():
+        if c.identifier in self._container_location:
             raise AssertionError("This container is already in the Store.")
 
-        # We could uncomment the following two lines:
-        # if not c.valid_container():
-        #     raise AssertionError("This is not a valid container")
+        # Checking c.valid_container() here would cost on every add: the probe
+        # files are checked all at once with check_containers before the simulation.
 
         if not self.can_add(c, p):
             raise AssertionError("This Container cannot be added to this particular Position at the moment.")
 
-        for i in range(c.size):
-            self._frame[p + i].append(c)
-
-        self._container_location[c.identifier] = (self.local_height(p) - 1, p)
+        self._added += 1
+        self._place(c, p, (c.delivery_start, -self._added, c))
+        if self._journal is not None:
+            self._journal.append(('ADD', c))
 
-        insort_left(self._containers_in_store, c)
+    # Compl: O(log(number of containers in the store))
+    def _place(self, c: Container, p: Position, entry: Entry) -> None:
+        """Puts a container on top of a position with a certain entry in the ordered index."""
 
-
-    # Compl: O(number of containers in the store) Removing from a sorted list.
+        if self._shared:
+            self._unshare()
+        identifier = c.identifier
+        removables = self._removables
+        frame = self._frame if self._owned is None else self._own(p, c.size)
+        for i in range(c.size):
+            column = frame[p + i]
+            if column:
+                removables.pop(column[-1], None)
+            column.append(identifier)
+        row = len(column) - 1
+
+        self._containers[identifier] = c
+        removables[identifier] = c
+        self._container_location[identifier] = (row, p)
+        # placement_key without the mask, which state_hash applies once
+        self._hash ^= hash((identifier, row, p))
+        self._heights.update(p, c.size, row + 1)
+
+        self._containers_in_store.add(entry)
+        if c.size not in self._containers_by_size:
+            self._containers_by_size[c.size] = SortedIndex()
+        self._containers_by_size[c.size].add(entry)
+        self._container_entry[c.identifier] = entry
+
+    # Compl: O(log(number of containers in the store)). Removing from the ordered index.
     def remove(self, c: Container) -> None:
         """Removes a container from the Store."""
 
-        if c.identifier not in self._container_location.keys():
+        if c.identifier not in self._container_location:
             raise AssertionError("This container is not in the Store.")
 
         if not self.can_remove(c):
             raise AssertionError("This Container cannot be removed from the Store at the moment.")
 
-        loc = self.location(c)
+        p, entry = self._take(c)
+        if self._journal is not None:
+            self._journal.append(('REMOVE', c, p, entry))
+
+    # Compl: O(log(number of containers in the store))
+    def _take(self, c: Container) -> Tuple[Position, Entry]:
+        """Takes a container from the top of its columns. Returns where it was and its entry in the ordered index."""
+
+        if self._shared:
+            self._unshare()
+        identifier = c.identifier
+        row, p = self._container_location.pop(identifier)
+        removables = self._removables
+        del removables[identifier]
+        frame = self._frame if self._owned is None else self._own(p, c.size)
         for i in range(c.size):
-            self._frame[loc[1] + i].pop()
-
-        self._containers_in_store.remove(c)
-
-        del self._container_location[c.identifier]
-
-    # Compl: O(number of containers in the store)
+            column = frame[p + i]
+            column.pop()
+            if column and column[-1] not in removables:
+                top = self._containers[column[-1]]
+                if self._on_top(top):
+                    removables[top.identifier] = top
+        self._heights.update(p, c.size, row)
+
+        entry = self._container_entry.pop(identifier)
+        self._containers_in_store.remove(entry)
+        self._containers_by_size[c.size].remove(entry)
+
+        del self._containers[identifier]
+        # placement_key without the mask, which state_hash applies once
+        self._hash ^= hash((identifier, row, p))
+        return p, entry
+
+    # Compl: O(log(number of containers in the store))
     def move(self, c: Container, p: Position) -> None:
         """Moves a container from the Store to a certain position."""
 
         self.remove(c)
         self.add(c, p)
 
+    # Compl: O(k * (size + log(number of containers in the store)))
+    def move_stack(self, p: Position, k: int, new_p: Position) -> List[Container]:
+        """Moves the top k containers of a position, one after the other, to a new position.
+        Returns the moved containers in the order they are moved (the top one first)."""
+
+        if not self.can_move_stack(p, k, new_p):
+            raise AssertionError("These Containers cannot be moved to this particular Position at the moment.")
+
+        if self._shared:
+            self._unshare()
+        ids = self._frame[p][-k:]
+        moved = [self._containers[i] for i in reversed(ids)]
+        size = moved[0].size
+        row, h = self.local_height(p) - k, self.local_height(new_p)
+
+        if self._owned is not None:
+            self._own(p, size)
+            self._own(new_p, size)
+        for i in range(size):
+            del self._frame[p + i][-k:]
+            column = self._frame[new_p + i]
+            if len(column) > 0:
+                self._removables.pop(column[-1], None)
+            column.extend(reversed(ids))
+        self._heights.update(p, size, row)
+        self._heights.update(new_p, size, h + k)
+
+        del self._removables[moved[0].identifier]
+        for i in range(size):
+            column = self._frame[p + i]
+            if len(column) > 0 and column[-1] not in self._removables:
+                top = self._containers[column[-1]]
+                if self._on_top(top):
+                    self._removables[top.identifier] = top
+        self._removables[moved[-1].identifier] = moved[-1]
+
+        for j, c in enumerate(moved):
+            self._hash ^= hash((c.identifier, *self._container_location[c.identifier]))
+            self._hash ^= hash((c.identifier, h + j, new_p))
+            self._container_location[c.identifier] = (h + j, new_p)
+            entry = self._container_entry[c.identifier]
+            if self._journal is not None:
+                self._journal.append(('MOVE', c, p, entry))
+            self._containers_in_store.remove(entry)
+            self._containers_by_size[size].remove(entry)
+            self._added += 1
+            entry = (c.delivery_start, -self._added, c)
+            self._containers_in_store.add(entry)
+            self._containers_by_size[size].add(entry)
+            self._container_entry[c.identifier] = entry
+        return moved
+
     # Compl: O(1)
-    def containers(self) -> List[Container]:
-        """Returns a list with all the containers in the Store."""
+    def checkpoint(self) -> None:
+        """Opens a checkpoint: from now on the operations are recorded so that they can be undone
+        by rollback. Checkpoints can be nested."""
+
+        if self._journal is None:
+            self._journal = []
+        self._checkpoints.append((len(self._journal), self._added, self._cash))
+
+    # Compl: O(number of operations undone * log(number of containers in the store))
+    def rollback(self) -> None:
+        """Undoes the operations done since the last open checkpoint, and closes it."""
+
+        if not self._checkpoints:
+            raise AssertionError("There is no checkpoint to roll back to.")
+        length, self._added, self._cash = self._checkpoints.pop()
+        while len(self._journal) > length:
+            operation = self._journal.pop()
+            if operation[0] == 'ADD':
+                self._take(operation[1])
+            else:
+                if operation[0] == 'MOVE':
+                    self._take(operation[1])
+                self._place(operation[1], operation[2], operation[3])
+        if not self._checkpoints:
+            self._journal = None
+
+    # Compl: O(1)
+    def commit(self) -> None:
+        """Closes the last open checkpoint keeping its operations (an outer checkpoint can still undo them)."""
+
+        if not self._checkpoints:
+            raise AssertionError("There is no checkpoint to commit.")
+        self._checkpoints.pop()
+        if not self._checkpoints:
+            self._journal = None
+
+    # Compl: O(1)
+    def fork(self) -> 'Store':
+        """Returns an independent copy of the Store (without its checkpoints). The structures are
+        shared and each store copies them the first time it changes, so a fork that is only
+        looked at, or the store it comes from while the fork lives, costs nothing. The columns
+        of the frame are copied one by one, the first time each of them changes."""
+
+        store = Store.__new__(Store)
+        store.__dict__.update(self.__dict__)
+        store._journal, store._checkpoints = None, []
+        store._shared = self._shared = True
+        return store
+
+    # Compl: O(number of containers in the store + width)
+    def _unshare(self) -> None:
+        """Copies the structures that may be shared with a fork, except the columns of the frame."""
+
+        # només es copia la llista de columnes: cada columna es copia a _own quan canvia per primer cop
+        self._frame = self._frame[:]
+        self._owned = set()
+        self._containers = dict(self._containers)
+        self._container_location = dict(self._container_location)
+        self._heights = self._heights.copy()
+        self._removables = dict(self._removables)
+        self._containers_in_store = self._containers_in_store.copy()
+        self._containers_by_size = {size: index.copy() for size, index in self._containers_by_size.items()}
+        self._container_entry = dict(self._container_entry)
+        self._shared = False
+
+    # Compl: O(k + sum of the heights of the columns copied)
+    def _own(self, p: Position, k: int) -> List[array]:
+        """Copies the columns from p to p + k - 1 that may still be shared with a fork. Returns the frame."""
+
+        frame, owned = self._frame, self._owned
+        if owned is None:
+            return frame
+        for i in range(p, p + k):
+            if i not in owned:
+                frame[i] = array('i', frame[i])
+                owned.add(i)
+        if len(owned) == self._width:
+            self._owned = None
+        return frame
+    # Compl: O(1)
+    def containers(self) -> SortedIndex:
+        """Returns all the containers in the Store, ordered by delivery time."""
 
         return self._containers_in_store
 
-    # Compl: O(width)
+    # Compl: O(1)
+    def first_container(self, size: Optional[int] = None, exclude: Optional[Container] = None) -> Optional[Container]:
+        """Returns the container of the Store with the earliest delivery time, if any. It can be
+        restricted to the containers of a certain size and a certain container can be skipped."""
+
+        index = self._containers_in_store if size is None else self._containers_by_size.get(size)
+        if index is None or len(index) == 0:
+            return None
+        c = index.first()
+        if c is exclude:
+            return index[1] if len(index) > 1 else None
+        return c
+
+    # Compl: O(number of removable containers)
     def removable_containers(self) -> List[Container]:
-        """Returns a list with all the immediatly removable containers in the Store."""
+        """Returns a list with all the immediatly removable containers in the Store, in no particular order."""
 
-        removables = [] # type: List[Container]
-        for i in range(self.width()):
-            top = self.top_container(i)
-            if top is not None and top != removables[-1]:
-                removables.append(top)
-        return removables
+        return list(self._removables.values())
+
+    # Compl: O(number of removable containers)
+    def profitable_containers(self, t: TimeStamp) -> List[Container]:
+        """Returns a list with all the immediatly removable containers in the Store that can be
+        delivered making profit at a certain time, in no particular order."""
+
+        return [c for c in self._removables.values() if c.removable(t) and c.makes_profit(t)]
 
     # Compl: O(1)
     def top_container(self, p: Position) -> Optional[Container]:
         """If not empty, returns the top container at the pth position."""
 
-        return self._frame[p][-1] if self.local_height(p) > 0 else None
+        if p < 0 or p >= self._width:
+            raise ValueError(p, "not a valid position.")
+
+        column = self._frame[p]
+        return self._containers[column[-1]] if column else None
+
+    # Compl: O(1) per container
+    def top_containers(self, p: Position) -> Iterator[Container]:
+        """Yields the containers at the pth position, from the top to the bottom."""
+
+        column = self._frame[p]
+        for i in range(len(column) - 1, -1, -1):
+            yield self._containers[column[i]]
+
+    # Compl: O(n log n)
+    def placements(self) -> List[Tuple[int, Position]]:
+        """Returns the identifier and the position of every container in the Store, from the lowest
+        row to the highest one (adding them in this order to an empty Store rebuilds it)."""
+
+        return [(identifier, p) for (row, p), identifier in
+                sorted((location, identifier) for identifier, location in self._container_location.items())]
+
+    # Compl: O(1)
+    def column(self, p: Position) -> array:
+        """Returns the identifiers of the containers that cover the pth column, from the bottom
+        to the top. The array belongs to the Store and must not be changed."""
+
+        return self._frame[p]
+
+    # Compl: O(1)
+    def state_hash(self) -> int:
+        """Returns a 64-bit hash of where every container is (not of the cash). Two stores with the
+        same containers at the same places have the same hash, whatever the operations that led there."""
+
+        return self._hash & MASK_64
+
+    # Compl: O(1)
+    def find(self, identifier: int) -> Optional[Container]:
+        """Returns the container of the Store with a certain identifier, if any."""
+
+        return self._containers.get(identifier)
 
     # Compl: O(1)
     def location(self, c: Container) -> Location:
         """Returns the location of a container"""
 
-        if c.identifier in self._container_location.keys():
-            return self._container_location[c.identifier]
+        location = self._container_location.get(c.identifier)
+        if location is not None:
+            return location
         raise ValueError("Container not in store. Location cannot be found.")
 
+    # Compl: O(number of containers above + size of the columns they cover above c)
+    def _above(self, c: Container) -> Dict[int, int]:
+        """Returns the row of each container that has to leave the Store before a container can."""
+
+        row, p = self.location(c)
+        rows = {}  # type: Dict[int, int]
+        scanned = {}  # type: Dict[Position, int]
+        pending = [(row, p, c.size)]
+        while pending:
+            row, p, size = pending.pop()
+            for i in range(p, p + size):
+                # a column is only scanned up to where a previous scan of it started
+                column = self._frame[i]
+                top = scanned.get(i, len(column))
+                if top <= row + 1:
+                    continue
+                scanned[i] = row + 1
+                for j in range(row + 1, top):
+                    identifier = column[j]
+                    if identifier not in rows:
+                        rows[identifier] = j
+                        pending.append((j, self._container_location[identifier][1], self._containers[identifier].size))
+        return rows
+
+    # Compl: the one of containers_above, without the sort
+    def depth(self, c: Container) -> int:
+        """Returns the number of containers that have to leave the Store before a container can
+        (see containers_above)."""
+
+        return len(self._above(c))
+
+    # Compl: O(number of containers above * log(number of containers above) + size of the columns they cover above c)
+    def containers_above(self, c: Container) -> List[Container]:
+        """Returns the containers that have to leave the Store before a container can: the ones piled
+        over it and, in turn, the ones piled over them, even in columns that it does not cover. They
+        are sorted from the highest to the lowest, an order in which they can be taken out."""
+
+        rows = self._above(c)
+        return [self._containers[k] for k in sorted(rows, key=rows.get, reverse=True)]
+
+    # Compl: O(number of containers * log(number of containers) + sum of their sizes)
+    def later_above(self) -> Dict[int, int]:
+        """Returns, for the identifier of each container of the Store, how many of the containers that
+        have to leave before it (see containers_above) have a later delivery start. All of them are
+        counted at once, from the top rows down, instead of scanning the columns for each one."""
+
+        # els contenidors són bits en l'ordre de lliurament, i els de sobre d'un contenidor són
+        # els que té just a sobre més els de sobre d'aquests
+        order = list(self._containers_in_store)
+        bits = {}  # type: Dict[int, int]
+        later = {}  # type: Dict[int, int]     # first bit of the containers with a later delivery start
+        first_later, start = len(order), None
+        for i in range(len(order) - 1, -1, -1):
+            c = order[i]
+            if c.delivery_start != start:
+                first_later, start = i + 1, c.delivery_start
+            bits[c.identifier] = 1 << i
+            later[c.identifier] = first_later
+        frame, containers = self._frame, self._containers
+        reach = {}  # type: Dict[int, int]     # bits of a container and the ones above it
+        counts = {}  # type: Dict[int, int]
+        for identifier, (row, p) in sorted(self._container_location.items(), key=operator.itemgetter(1), reverse=True):
+            mask = 0
+            for column in frame[p:p + containers[identifier].size]:
+                if len(column) > row + 1:
+                    mask |= reach[column[row + 1]]
+            reach[identifier] = mask | bits[identifier]
+            counts[identifier] = bin(mask >> later[identifier]).count('1')
+        return counts
+
     # Compl: O(c.size)
     def can_add(self, c: Container, p: Position) -> bool:
         """Returns whether a container can be added in a certain position."""
 
         h = self.local_height(p)
-        for i in range(1, c.size):
-            if self.local_height(p + i) != h:
+        for i in range(p + 1, p + c.size):
+            if i >= self._width:
+                raise ValueError(i, "not a valid position.")
+            if len(self._frame[i]) != h:
                 return False
         return True
 
-    # Compl: O(c.size)
+    # Compl: O(block + log width) per block of columns changed since the last query
+    def leftmost_position(self, size: int) -> Optional[Position]:
+        """Returns the leftmost position where a container of a certain size can be added, if any."""
+
+        if size <= 0 or size > MAX_SIZE:
+            raise ValueError(size, "not a valid container size.")
+        return self._heights.leftmost(size)
+
+    # Compl: O(block + log width) per block of columns changed since the last query
+    def lowest_position(self, size: int) -> Optional[Position]:
+        """Returns the lowest position where a container of a certain size can be added, if any.
+        Among positions of the same height, the leftmost one."""
+
+        if size <= 0 or size > MAX_SIZE:
+            raise ValueError(size, "not a valid container size.")
+        return self._heights.lowest(size)
+
+    # Compl: O((number of positions + 1) * log width + block)
+    def available_positions(self, c: Container) -> List[Position]:
+        """Returns, from left to right, all the positions where a container can be added."""
+
+        if c.size <= 0 or c.size > MAX_SIZE:
+            raise ValueError(c.size, "not a valid container size.")
+        return self._heights.positions(c.size)
+
+    # Compl: O(k * size)
+    def can_move_stack(self, p: Position, k: int, new_p: Position) -> bool:
+        """Returns whether the top k containers of a position can be moved as a block to a new
+        position: they must have the same size, be aligned at p and not share columns with
+        anything else, and the new position must not overlap their columns."""
+
+        if k <= 0 or k > self.local_height(p):
+            return False
+        ids = self._frame[p][-k:]
+        size = self._containers[ids[0]].size
+        for i in ids:
+            if self._containers[i].size != size or self._container_location[i][1] != p:
+                return False
+        for i in range(1, size):
+            if self._frame[p + i][-k:] != ids:
+                return False
+        if new_p < p + size and p < new_p + size or new_p + size > self.width():
+            return False
+        return self.can_add(self._containers[ids[0]], new_p)
+
+    # Compl: O(1)
     def can_remove(self, c: Container) -> bool:
         """Returns whether a container can be removed from the Store or not."""
 
-        loc = self.location(c)
+        self.location(c)
+        return c.identifier in self._removables
+
+    # Compl: O(c.size)
+    def _on_top(self, c: Container) -> bool:
+        """Returns whether a container of the Store is the top of every column it covers."""
+
+        p = self._container_location[c.identifier][1]
         for i in range(c.size):
-            if self.top_container(loc[1]+i) != c:
+            if self._frame[p + i][-1] != c.identifier:
                 return False
         return True
 
 
-    def write(self, stdscr: curses.window, caption: str = ''):
+    def write(self, stdscr: curses.window, caption: str = '', delay: float = 0.05):
         maximum = 15  # maximum number of rows to write
-        delay = 0.05  # delay after writing the state
 
         # start: clear screen
         stdscr.clear()
@@ -255,103 +1024,1032 @@ class Store:
 
         # done
         stdscr.refresh()
-        time.sleep(delay)
+        if delay > 0:
+            time.sleep(delay)
+
+
+# Dibuixa el magatzem mentre es reprodueix un registre. En lloc d'esborrar la
+# pantalla i esperar després de cada acció com Store.write, només redibuixa les
+# columnes que han canviat, dibuixa cada N accions o cada T segons i marca el
+# ritme llegint el teclat amb un temps d'espera.
+class Renderer:
+
+    """
+    Draws a store on a curses window as actions are applied to it. Keys: space pauses and
+    resumes, '.' does one action while paused, '+' and '-' double and halve the speed, 'n' or
+    the right arrow skips the next seek actions without drawing and 'q' skips to the end.
+    """
+
+    rows: int = 15                                  # maximum number of rows to write
+    _stdscr: curses.window
+    _store: Store
+    _speed: Optional[float]                         # actions per second (None for as fast as possible)
+    _every: int                                     # actions between frames
+    _interval: Optional[float]                      # seconds between frames, if it comes before every actions
+    _seek: int                                      # actions skipped by 'n'
+    _drawn: List[Optional[array]]                   # visible identifiers of each column as they are drawn
+    _pending: int                                   # actions since the last frame
+    _last_frame: float                              # time of the last frame
+    _due: float                                     # time when the next action is due
+    _paused: bool
+    _skip: int                                      # actions left to do without drawing nor waiting (-1 for all)
+
+    def __init__(self, stdscr: curses.window, store: Store, speed: Optional[float] = 20.0, every: int = 1,
+                 interval: Optional[float] = None, seek: int = 1000):
+        self._stdscr = stdscr
+        self._store = store
+        self._speed, self._every, self._interval, self._seek = speed, every, interval, seek
+        self._drawn = [None] * store.width()
+        self._pending = 0
+        self._last_frame = self._due = time.monotonic()
+        self._paused = False
+        self._skip = 0
+        stdscr.clear()
+        stdscr.addstr(self.rows + 3, 0, '—' * 2 * store.width())
+        self.draw()
+
+    def draw(self, caption: str = '') -> None:
+        """Writes the caption, the cash and the columns changed since the last frame."""
+
+        stdscr, store = self._stdscr, self._store
+        stdscr.move(0, 0)
+        stdscr.clrtoeol()
+        stdscr.addstr(0, 0, caption)
+        stdscr.move(self.rows + 4, 0)
+        stdscr.clrtoeol()
+        stdscr.addstr(self.rows + 4, 0, '$: ' + str(store.cash()))
+        for p in range(store.width()):
+            column = store.column(p)[:self.rows]
+            if column == self._drawn[p]:
+                continue
+            for row in range(self.rows):
+                y = self.rows - row + 2
+                if row < len(column):
+                    c = store.find(column[row])
+                    color = curses.color_pair(1 + c.identifier * 764351 % 250)  # the same colors as Store.write
+                    label = str(c.identifier % 100) if store.location(c)[1] == p else ''
+                    stdscr.addstr(y, 2 * p, label.ljust(2), color)
+                else:
+                    stdscr.addstr(y, 2 * p, '  ')
+            self._drawn[p] = column
+        stdscr.refresh()
+        self._pending = 0
+        self._last_frame = time.monotonic()
+
+    def action(self, caption: str = '') -> None:
+        """Called after each action applied to the store: draws a frame when one is due and waits
+        for the time of the next action, attending the keys meanwhile."""
+
+        self._pending += 1
+        if self._skip != 0:
+            # -1 skips to the end
+            if self._skip > 0:
+                self._skip -= 1
+                if self._skip == 0:
+                    self.draw(caption)
+                    self._due = time.monotonic()
+            return
+        now = time.monotonic()
+        if self._pending >= self._every or (self._interval is not None and now - self._last_frame >= self._interval):
+            self.draw(caption)
+        if self._speed is not None:
+            # an action that comes late does not make the next ones go faster
+            self._due = max(self._due + 1 / self._speed, now)
+        self._keys(caption)
+
+    def finish(self, caption: str = '') -> None:
+        """Draws the last state."""
+
+        self.draw(caption)
+
+    def _keys(self, caption: str) -> None:
+        while True:
+            if self._paused:
+                self._stdscr.timeout(-1)
+            else:
+                wait = self._due - time.monotonic() if self._speed is not None else 0
+                self._stdscr.timeout(max(0, int(wait * 1000)))
+            key = self._stdscr.getch()
+            if key == ord(' '):
+                self._paused = not self._paused
+                self._due = time.monotonic()
+            elif key == ord('.') and self._paused:
+                return
+            elif key == ord('+') and self._speed is not None:
+                self._speed *= 2
+            elif key == ord('-') and self._speed is not None:
+                self._speed /= 2
+            elif key in (ord('n'), curses.KEY_RIGHT):
+                self._skip, self._paused = self._seek, False
+                return
+            elif key == ord('q'):
+                self._skip, self._paused = -1, False
+                return
+            elif key == -1 and not self._paused:
+                return
+
+
+# action, with its arguments, logged at a certain time
+Record = Tuple[TimeStamp, str, Tuple[int, ...]]
+
+# actions of a log, in the order of their code in the binary format
+LOG_ACTIONS = ('START', 'ADD', 'REMOVE', 'MOVE', 'CASH', 'SNAPSHOT')
+
+# number of arguments of each action (a SNAPSHOT has the cash and then an identifier
+# and a position for each container in the store)
+LOG_ARGUMENTS = {'ADD': 2, 'REMOVE': 1, 'MOVE': 2, 'CASH': 1}
+
+# binary format: magic, header (width, length of the name) and 13-byte records (time, action,
+# two 32-bit arguments). The cash, which can need more bits, is split in two words: a CASH
+# record has its high and low words. A SNAPSHOT record has the number of containers n, and it
+# is followed by a record with the words of the cash and n records with the identifier and the
+# position of each container.
+LOG_MAGIC = b'CLG2'
+LOG_HEADER = Struct('<qH')
+LOG_RECORD = Struct('<iBii')
+
+# magic of the first binary format, whose records had a 64-bit first argument
+LOG_MAGIC_V1 = b'CLOG'
+
+
+def cash_words(cash: int) -> Tuple[int, int]:
+    """Returns the high and the low 32-bit words (as signed integers) of the cash."""
+
+    low = cash & 0xFFFFFFFF
+    return cash >> 32, low - (1 << 32) if low >= 1 << 31 else low
+
+
+def cash_value(high: int, low: int) -> int:
+    """Returns the cash of its two words (the inverse of cash_words)."""
+
+    return (high << 32) | (low & 0xFFFFFFFF)
 
 
 # Registra els moviments que una estratègia realitza en un magatzem. Serveix
 # per comprovar que les accions realitzades són correctes i visualitzar l'evolució
 # del magatzem amb el pas del temps.
+# Un registre es pot escriure en format text (una acció per línia, com sempre) o
+# en format binari: la capçalera LOG_MAGIC, l'amplada i el nom del magatzem, i
+# després un registre de 13 bytes (temps, acció, dos enters de 32 bits) per acció.
+# Opcionalment, cada cert nombre d'accions s'hi guarda l'estat del magatzem (SNAPSHOT),
+# de manera que el registre es pot validar a trossos.
 class Logger:
 
     """Class to log store actions to a file."""
 
-    _file: TextIO
-
-    def __init__(self, path: str, name: str, width: int):
-        self._file = open(path, 'w')
-        print(0, 'START', name, width, file=self._file)
+    _file: Union[TextIO, BinaryIO]
+    _binary: bool                                   # whether the log is written in binary format
+    _buffer: list                                   # records not written to the file yet
+    _buffer_size: int                               # number of records buffered before writing them
+    _snapshot_every: int                            # number of records between snapshots (0 for none)
+    _since_snapshot: int                            # number of records since the last snapshot
+    _sinks: list                                    # objects that also receive every record (see ShadowValidator)
+
+    def __init__(self, path: str, name: str, width: int, binary: bool = False, buffer_size: int = 4096,
+                 snapshot_every: int = 0):
+        self._binary = binary
+        self._buffer = []
+        self._buffer_size = buffer_size
+        self._snapshot_every = snapshot_every
+        self._since_snapshot = 0
+        self._sinks = []
+        if binary:
+            self._file = open(path, 'wb')
+            encoded = name.encode()
+            self._file.write(LOG_MAGIC + LOG_HEADER.pack(width, len(encoded)) + encoded)
+        else:
+            self._file = open(path, 'w')
+            print(0, 'START', name, width, file=self._file)
+
+    def __enter__(self) -> 'Logger':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def attach(self, sink) -> None:
+        """Sends every record logged from now on to sink.record(t, what, args, c) too."""
+
+        self._sinks.append(sink)
+
+    def record(self, t: TimeStamp, what: str, *args: int, c: Optional[Container] = None):
+        """Logs an action with its arguments (as they appear in the text format) and, if any,
+        the container it acts on."""
+
+        for sink in self._sinks:
+            sink.record(t, what, args, c)
+        if not self._binary:
+            self._buffer.append(' '.join(map(str, (t, what) + args)) + '\n')
+        elif what == 'SNAPSHOT':
+            code = LOG_ACTIONS.index(what)
+            self._buffer.append(LOG_RECORD.pack(t, code, (len(args) - 1) // 2, 0))
+            self._buffer.append(LOG_RECORD.pack(t, code, *cash_words(args[0])))
+            for i in range(1, len(args), 2):
+                self._buffer.append(LOG_RECORD.pack(t, code, args[i], args[i + 1]))
+        elif what == 'CASH':
+            self._buffer.append(LOG_RECORD.pack(t, LOG_ACTIONS.index(what), *cash_words(args[0])))
+        else:
+            self._buffer.append(LOG_RECORD.pack(t, LOG_ACTIONS.index(what), *args, *(0,) * (2 - len(args))))
+        self._since_snapshot += 1
+        if len(self._buffer) >= self._buffer_size:
+            self._write_buffer()
 
     def add(self, t: TimeStamp, c: Container, p: Position):
-        print(t, 'ADD', c.identifier, p, file=self._file)
+        self.record(t, 'ADD', c.identifier, p, c=c)
 
     def remove(self, t: TimeStamp, c: Container):
-        print(t, 'REMOVE', c.identifier, file=self._file)
+        self.record(t, 'REMOVE', c.identifier, c=c)
 
     def move(self, t: TimeStamp, c: Container, p: Position):
-        print(t, 'MOVE', c.identifier, p, file=self._file)
+        self.record(t, 'MOVE', c.identifier, p, c=c)
+
+    def moves(self, t: TimeStamp, cs: List[Container], p: Position):
+        """Logs the moves of several containers to the same position, one per time step from t."""
+
+        for i, c in enumerate(cs):
+            self.record(t + i, 'MOVE', c.identifier, p, c=c)
 
     def cash(self, t: TimeStamp, cash: int):
-        print(t, 'CASH', cash, file=self._file)
+        self.record(t, 'CASH', cash)
+
+    def snapshot(self, t: TimeStamp, store: Store):
+        """Logs the state of the store: its cash and where each container is."""
+
+        args = [store.cash()]
+        for identifier, p in store.placements():
+            args += [identifier, p]
+        self.record(t, 'SNAPSHOT', *args)
+        self._since_snapshot = 0
+
+    def checkpoint(self, t: TimeStamp, store: Store):
+        """Logs the state of the store if enough actions have been logged since the last time.
+        It has to be called when the store is in the state the logged actions lead to."""
+
+        if self._snapshot_every > 0 and self._since_snapshot >= self._snapshot_every:
+            self.snapshot(t, store)
+
+    def _write_buffer(self) -> None:
+        self._file.write((b'' if self._binary else '').join(self._buffer))
+        self._buffer.clear()
+
+    def flush(self) -> None:
+        """Writes all the buffered records to the file."""
+
+        self._write_buffer()
+        self._file.flush()
+
+    def close(self) -> None:
+        """Writes all the buffered records and closes the file."""
+
+        if not self._file.closed:
+            self._write_buffer()
+            self._file.close()
+
+
+# size of the blocks (cut at the end of a line) text files are parsed in
+BLOCK_SIZE = 1 << 16
+
+
+def map_file(file: BinaryIO) -> Optional[mmap.mmap]:
+    """Maps a file opened for reading in memory. Returns None if it is empty (it cannot be mapped)."""
+
+    if os.fstat(file.fileno()).st_size == 0:
+        return None
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def blocks(data: mmap.mmap, start: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """Yields the offset and the bytes of consecutive blocks of whole lines of a mapped file from start."""
+
+    while start < len(data):
+        end = data.find(b'\n', min(start + BLOCK_SIZE, len(data)) - 1)
+        end = len(data) if end < 0 else end + 1
+        yield start, data[start:end]
+        start = end
+
+
+# Llegeix un registre en qualsevol dels dos formats, projectat a memòria (mmap).
+# Els registres es van llegint a mesura que es recorren, sense carregar el fitxer
+# sencer, i es pot començar i acabar a qualsevol registre donat per la seva posició
+# (en bytes) al fitxer, o saltar al primer registre d'un cert temps.
+class LogReader:
+
+    """Class to read the actions of a log file, in text or binary format."""
+
+    name: str                                       # name of the strategy
+    width: int                                      # width of the store
+    binary: bool                                    # whether the log is in binary format
+    start: int                                      # offset of the first record after START
+    _file: BinaryIO
+    _data: mmap.mmap                                # the file mapped in memory
+    _index: Optional[List[Tuple[TimeStamp, int, int]]]  # time, offset and line of the first record of each block (text)
+    _payloads: Optional[List[Tuple[int, int]]]      # end of each snapshot and number of records after its first one so far (binary)
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        data = map_file(self._file)
+        assert data is not None, "The log is empty."
+        self._data = data
+        self._index = None
+        self._payloads = None
+        self.binary = data[:len(LOG_MAGIC)] == LOG_MAGIC
+        assert data[:len(LOG_MAGIC_V1)] != LOG_MAGIC_V1, "The log is in the first binary format, which is not read anymore."
+        if self.binary:
+            self.width, length = LOG_HEADER.unpack_from(data, len(LOG_MAGIC))
+            self.start = len(LOG_MAGIC) + LOG_HEADER.size + length
+            self.name = data[self.start - length:self.start].decode()
+        else:
+            end = data.find(b'\n')
+            self.start = len(data) if end < 0 else end + 1
+            tokens = data[:self.start].split()
+            assert len(tokens) == 4
+            assert tokens[0] == b"0"
+            assert tokens[1] == b"START"
+            self.name = tokens[2].decode()
+            self.width = int(tokens[3])
+
+    def __enter__(self) -> 'LogReader':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Record]:
+        for line, t, what, args in self.records():
+            yield t, what, args
+
+    def records(self, start: Optional[int] = None, end: Optional[int] = None, line: int = 2) \
+            -> Iterator[Tuple[int, TimeStamp, str, Tuple[int, ...]]]:
+        """
+        Yields the line of the log and the record of each record from the one at offset start (the first
+        one by default) to the one at offset end, included (the last one by default). line is the line of
+        the record at start (the START line is line 1). In binary format each record is a line, and the cash
+        and the containers of a snapshot are part of its line. Raises a LogError at a record that cannot be
+        read (in binary format, also when the log ends in the middle of one), at the time of the last one read.
+        """
+
+        offset = self.start if start is None else start
+        end = len(self._data) if end is None else end
+        data = self._data
+        last = 0
+        if self.binary:
+            size = LOG_RECORD.size
+            while offset <= min(end, len(data) - 1):
+                if offset + size > len(data):
+                    raise LogError(line, last, f"unreadable record: the log ends in the middle of a record "
+                                               f"({len(data) - offset} bytes left)")
+                t, code, a, b = LOG_RECORD.unpack_from(data, offset)
+                offset += size
+                if not 0 < code < len(LOG_ACTIONS):
+                    raise LogError(line, last, f"unreadable record: unknown action code {code}")
+                what = LOG_ACTIONS[code]
+                if what == 'SNAPSHOT':
+                    # the cash and the containers of the snapshot
+                    if a < 0 or offset + (a + 1) * size > len(data):
+                        raise LogError(line, last, f"unreadable record: the snapshot of {a} containers runs past "
+                                                   f"the end of the log")
+                    args = [cash_value(*LOG_RECORD.unpack_from(data, offset)[2:])]
+                    offset += size
+                    for i in range(a):
+                        args += LOG_RECORD.unpack_from(data, offset)[2:]
+                        offset += size
+                    yield line, t, what, tuple(args)
+                elif what == 'CASH':
+                    yield line, t, what, (cash_value(a, b),)
+                else:
+                    yield line, t, what, (a, b) if LOG_ARGUMENTS[what] == 2 else (a,)
+                line += 1
+                last = t
+        else:
+            actions = {what.encode(): what for what in LOG_ACTIONS}
+            for offset, block in blocks(data, offset):
+                for i, text in enumerate(block.split(b'\n')):
+                    tokens = text.split()
+                    if tokens:
+                        if offset > end:
+                            return
+                        try:
+                            t, what, args = int(tokens[0]), actions.get(tokens[1]) or tokens[1].decode(), \
+                                            tuple(map(int, tokens[2:]))
+                        except (ValueError, IndexError) as error:
+                            raise LogError(line + i, last, f'unreadable record: {error!r}') from error
+                        yield line + i, t, what, args
+                        last = t
+                    offset += len(text) + 1
+                # the blank lines are not records, but they are lines
+                line += block.count(b'\n')
+
+    def snapshots(self) -> List[Tuple[int, int]]:
+        """Returns the offset and the line (the START line is line 1) of each SNAPSHOT record."""
+
+        found = []  # type: List[Tuple[int, int]]
+        data = self._data
+        line = 2
+        if self.binary:
+            size = LOG_RECORD.size
+            code = LOG_ACTIONS.index('SNAPSHOT')
+            offset, last = self.start, len(data) - size
+            self._payloads = []
+            while offset <= last:
+                t, action, a, b = LOG_RECORD.unpack_from(data, offset)
+                if action == code:
+                    found.append((offset, line))
+                    offset += (a + 1) * size  # the cash and the containers of the snapshot
+                    self._payloads.append((offset, a + 1 + (self._payloads[-1][1] if self._payloads else 0)))
+                offset += size
+                line += 1
+        else:
+            for offset, block in blocks(data, self.start):
+                if b'SNAPSHOT' in block:
+                    for text in block.split(b'\n'):
+                        if b'SNAPSHOT' in text:
+                            found.append((offset, line))
+                        offset += len(text) + 1
+                        line += 1
+                    line -= 1
+                else:
+                    line += block.count(b'\n')
+        return found
+
+    def seek_time(self, t: TimeStamp) -> Tuple[int, int]:
+        """Returns the offset and the line of the first record at time t or later
+        (or the end of the log if there is none)."""
+
+        data = self._data
+        if self.binary:
+            # the records are sorted by time (the ones of a snapshot have its time)
+            size = LOG_RECORD.size
+            low, high = 0, (len(data) - self.start) // size
+            while low < high:
+                mid = (low + high) // 2
+                if LOG_RECORD.unpack_from(data, self.start + mid * size)[0] < t:
+                    low = mid + 1
+                else:
+                    high = mid
+            # each record is a line, but the cash and the containers of a snapshot are part of its line
+            if self._payloads is None:
+                self.snapshots()
+            i = bisect_left(self._payloads, (self.start + low * size,))
+            return self.start + low * size, low + 2 - (self._payloads[i - 1][1] if i > 0 else 0)
+
+        if self._index is None:
+            self._index = []
+            line = 2
+            for offset, block in blocks(data, self.start):
+                if block.strip():
+                    self._index.append((int(block.split(None, 1)[0]), offset, line))
+                line += block.count(b'\n')
+        if not self._index:
+            return len(data), 2
+        # the last block starting before t can already have records at time t
+        first, start, line = self._index[max(bisect_left(self._index, (t,)) - 1, 0)]
+        for offset, block in blocks(data, start):
+            for text in block.split(b'\n'):
+                tokens = text.split(None, 1)
+                if tokens and int(tokens[0]) >= t:
+                    return offset, line
+                offset += len(text) + 1
+                line += 1
+            if block.endswith(b'\n'):
+                line -= 1  # the piece after the last end of line is not a line
+        return len(data), line
+
+    def close(self) -> None:
+        self._data.close()
+        self._file.close()
+
+
+def convert_log(source_path: str, target_path: str, binary: bool) -> None:
+    """Writes the log at source_path, in any format, to target_path in binary or text format."""
+
+    with LogReader(source_path) as reader, Logger(target_path, reader.name, reader.width, binary) as logger:
+        for t, what, args in reader:
+            logger.record(t, what, *args)
+
+
+def iter_containers(path: str) -> Iterator[Container]:
+    """Yields the containers of a file at path one by one, without keeping them."""
+
+    for line, block in _container_blocks(path):
+        values = parse_containers(block, line)
+        for i in range(0, len(values), 7):
+            identifier, size, value, arrival_start, arrival_end, delivery_start, delivery_end = values[i:i + 7]
+            yield Container(identifier, size, value, TimeRange(
+                arrival_start, arrival_end), TimeRange(delivery_start, delivery_end))
+
+
+def _container_blocks(path: str) -> Iterator[Tuple[int, bytes]]:
+    """Yields the blocks of whole lines of a file at path with the line where each one starts."""
+
+    with open(path, 'rb') as file:
+        data = map_file(file)
+        if data is None:
+            return
+        with data:
+            line = 1
+            for offset, block in blocks(data):
+                yield line, block
+                line += block.count(b'\n')
+
+
+def parse_containers(block: bytes, line: int, bad: Optional[List[Tuple[int, str]]] = None,
+                     rows: Optional[array] = None) -> array:
+    """
+    Returns the fields of the containers of a block of whole lines that starts at a certain line
+    of its file. Blank lines are skipped. A line without 7 integer fields raises a ValueError
+    with its line or, if bad is given, is added to bad and skipped. If rows is given, the line
+    of each container is appended to it.
+    """
+
+    lines = block.split(b'\n')
+    counts = list(map(len, map(bytes.split, lines)))
+    # fast path: a single split of the whole block when every line is a container
+    blank = counts.count(0)
+    if counts.count(7) + blank == len(counts) and (rows is None or blank == lines[-1:].count(b'')):
+        try:
+            values = array('q', map(int, block.split()))
+        except ValueError:
+            pass
+        else:
+            if rows is not None:
+                rows.extend(range(line, line + len(values) // 7))
+            return values
+
+    values = array('q')
+    for i, text in enumerate(lines):
+        fields = text.split()
+        if not fields:
+            continue
+        problem = None
+        if len(fields) != 7:
+            problem = "Each container should have 7 fields."
+        else:
+            try:
+                values.extend(map(int, fields))
+            except ValueError:
+                del values[len(values) - len(values) % 7:]
+                problem = "The fields of a container should be integers."
+        if problem is None:
+            if rows is not None:
+                rows.append(line + i)
+        elif bad is None:
+            raise ValueError(f"line {line + i}: {problem}")
+        else:
+            bad.append((line + i, problem))
+    return values
 
 
 def read_containers(path: str) -> List[Container]:
     """Returns a list of containers read from a file at path."""
 
-    with open(path, 'r') as file:
-        containers: List[Container] = []
-        for line in file:
-            identifier, size, value, arrival_start, arrival_end, delivery_start, delivery_end = map(
-                int, line.split())
-            container = Container(identifier, size, value, TimeRange(
-                arrival_start, arrival_end), TimeRange(delivery_start, delivery_end))
-            containers.append(container)
-        return containers
+    return list(iter_containers(path))
+
+
+# Containers of a file kept as one array of integers per field. A Container
+# object is only built when it is asked for.
+class ContainerColumns:
+
+    """Columnar table of containers."""
+
+    identifier: array
+    size: array
+    value: array
+    arrival_start: array
+    arrival_end: array
+    delivery_start: array
+    delivery_end: array
+    lines: Optional[array]                          # line of the file of each row (None if row i is line i + 1)
+    _rows: Optional[Dict[int, int]]                 # row of each identifier, built when first needed
+
+    fields = ('identifier', 'size', 'value', 'arrival_start', 'arrival_end', 'delivery_start', 'delivery_end')
+
+    def __init__(self, values: array, lines: Optional[array] = None):
+        """Builds the table from the fields of all the containers one after the other and,
+        if they are not consecutive from the first one, the line of each container."""
+
+        if len(values) % len(self.fields) != 0:
+            raise ValueError("Each container should have", len(self.fields), "fields.")
+        for i, field in enumerate(self.fields):
+            setattr(self, field, values[i::len(self.fields)])
+        self.lines = lines
+        self._rows = None
+
+    def __len__(self) -> int:
+        return len(self.identifier)
+
+    def __getitem__(self, i: int) -> Container:
+        return Container(self.identifier[i], self.size[i], self.value[i],
+                         TimeRange(self.arrival_start[i], self.arrival_end[i]),
+                         TimeRange(self.delivery_start[i], self.delivery_end[i]))
+
+    def __iter__(self) -> Iterator[Container]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def line(self, i: int) -> int:
+        """Returns the line of the file of the ith container."""
+
+        return self.lines[i] if self.lines is not None else i + 1
+
+    def find(self, identifier: int) -> Container:
+        """Returns a new Container with the fields of the one with a certain identifier."""
+
+        if self._rows is None:
+            self._rows = {k: i for i, k in enumerate(self.identifier)}
+        return self[self._rows[identifier]]
+
+
+def read_container_columns(path: str) -> ContainerColumns:
+    """Returns the containers of a file at path as a columnar table, read in a single pass."""
+
+    values = array('q')
+    for line, block in _container_blocks(path):
+        values.extend(parse_containers(block, line))
+    return ContainerColumns(values)
+
+
+class ProbeError(Exception):
+
+    """Exception raised by check_containers."""
+
+    errors: List[Tuple[int, str]]                   # line (the first container is line 1) and problem of each bad row
 
+    def __init__(self, errors: List[Tuple[int, str]]):
+        super().__init__('\n'.join(f'line {line}: {message}' for line, message in errors))
+        self.errors = errors
 
-def check_and_show(containers_path: str, log_path: str, stdscr: Optional[curses.window] = None):
+    def __reduce__(self):
+        return ProbeError, (self.errors,)
+
+
+# Les regles de valid_container es comproven per columnes: cada comparació es fa
+# amb map i compress sobre els arrays, sense un bucle de Python per fila.
+def _bad_rows(check: Callable[[int, int], bool], a: Iterator[int], b: Iterator[int]) -> Iterator[int]:
+    """Returns the rows i where check(a[i], b[i]) is true (row i is line i + 1 of the file)."""
+
+    return compress(count(), map(check, a, b))
+
+
+def container_errors(columns: ContainerColumns) -> List[Tuple[int, str]]:
+    """
+    Returns the line of the file and the problem of every container of a table that breaks
+    a rule of valid_container, has an identifier or a time that does not fit in 32 bits,
+    repeats an identifier or arrives before the previous container has left the arrival area,
+    sorted by line.
+    """
+
+    n = len(columns)
+    checks = [
+        (operator.lt, columns.size, repeat(1), "The size should be at least 1."),
+        (operator.gt, columns.size, repeat(MAX_SIZE), f"The size should be at most {MAX_SIZE}."),
+        (operator.lt, columns.value, repeat(0), "The value should not be negative."),
+        (operator.gt, columns.arrival_start, columns.arrival_end, "The arrival range is not well formed."),
+        (operator.gt, columns.delivery_start, columns.delivery_end, "The delivery range is not well formed."),
+        (operator.lt, columns.delivery_end, columns.arrival_start, "The delivery ends before the arrival."),
+    ]
+    for field in ('identifier', 'arrival_start', 'arrival_end', 'delivery_start', 'delivery_end'):
+        message = f"The {field.replace('_', ' ')} should fit in 32 bits."
+        checks.append((operator.lt, getattr(columns, field), repeat(INT32_MIN), message))
+        checks.append((operator.gt, getattr(columns, field), repeat(INT32_MAX), message))
+    line = columns.line
+    errors = [(line(i), message) for check, a, b, message in checks for i in _bad_rows(check, a, b)]
+    # the container of row i arrives when the one of row i - 1 is gone
+    errors.extend((line(i + 1), "The container arrives before the previous one has been treated.")
+                  for i in _bad_rows(operator.lt, columns.arrival_start[1:], columns.arrival_end[:n - 1]))
+    if len(set(columns.identifier)) != n:
+        first = {}  # type: Dict[int, int]
+        for i, identifier in enumerate(columns.identifier):
+            if identifier in first:
+                errors.append((line(i), f"The identifier {identifier} is already used at line {line(first[identifier])}."))
+            else:
+                first[identifier] = i
+    errors.sort(key=lambda error: error[0])
+    return errors
+
+
+def check_containers(path: str) -> ContainerColumns:
+    """
+    Returns the containers of a file at path as a columnar table.
+    Raises a ProbeError with all the bad lines if any is not a valid container.
+    """
+
+    values, lines = array('q'), array('q')
+    bad = []  # type: List[Tuple[int, str]]
+    for line, block in _container_blocks(path):
+        values.extend(parse_containers(block, line, bad, lines))
+    columns = ContainerColumns(values, lines)
+    # the lines without 7 integer fields are not in the table, so they are reported apart
+    errors = sorted(bad + container_errors(columns), key=lambda error: error[0])
+    if errors:
+        raise ProbeError(errors)
+    return columns
+
+
+# Kinds of events, in the order the events of the same time are handled: the
+# containers whose delivery range closes or opens are known before the next
+# container arrives at that time.
+DELIVERY_CLOSE, DELIVERY_OPEN, ARRIVAL = range(3)
+
+
+class Event(NamedTuple):
+    time: TimeStamp
+    kind: int                                       # DELIVERY_CLOSE, DELIVERY_OPEN or ARRIVAL
+    order: int                                      # order of insertion, to break ties without comparing containers
+    container: Container
+
+
+# Cua de prioritat d'esdeveniments (heapq). Els esdeveniments d'un contenidor que
+# ja no hi és no s'esborren: qui els rep els descarta.
+class EventQueue:
+
+    """Events ordered by time and kind."""
+
+    _heap: List[Event]
+    _pushed: int                                    # number of events pushed so far
+
+    def __init__(self):
+        self._heap = []
+        self._pushed = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    # Compl: O(log number of events)
+    def push(self, t: TimeStamp, kind: int, c: Container) -> None:
+        """Adds an event of a certain kind for a container at time t."""
+
+        heapq.heappush(self._heap, Event(t, kind, self._pushed, c))
+        self._pushed += 1
+
+    # Compl: O(log number of events)
+    def pop(self) -> Event:
+        """Removes and returns the first event."""
+
+        return heapq.heappop(self._heap)
+
+    # Compl: O(1)
+    def next_time(self) -> Optional[TimeStamp]:
+        """Returns the time of the first event, if any."""
+
+        return self._heap[0].time if self._heap else None
+
+    # Compl: O(log number of events) per event
+    def events_until(self, t: TimeStamp) -> Iterator[Event]:
+        """Removes and yields, in order, the delivery events before time t (an arrival stops it)."""
+
+        while self._heap and self._heap[0].time < t and self._heap[0].kind != ARRIVAL:
+            yield heapq.heappop(self._heap)
+
+    def schedule(self, c: Container) -> None:
+        """Adds the events of the delivery range of a container."""
+
+        self.push(c.delivery_start, DELIVERY_OPEN, c)
+        self.push(c.delivery_end, DELIVERY_CLOSE, c)
+
+
+def simulate(strategy, containers: Iterator[Container], events: Optional[EventQueue] = None) -> None:
+    """
+    Drives a strategy with the events of the containers in time order: strategy.exec(c) when c
+    arrives and, if the strategy has it, strategy.on_event(event) when the delivery range of a
+    container that has arrived opens or closes. The containers must come in arrival order; only
+    the next one is read ahead. The delivery events are only scheduled for a strategy that has
+    on_event or use_events: simulate calls strategy.use_events(events) before the first arrival,
+    and the strategy can then look at the next interesting time with events.next_time() instead
+    of polling, and take the events of its arrival range inside exec with
+    events.events_until(c.arrival_end) (simulate does not send them again).
+    """
+
+    if events is None:
+        events = EventQueue()
+    on_event = getattr(strategy, 'on_event', None)
+    use_events = getattr(strategy, 'use_events', None)
+    if use_events is not None:
+        use_events(events)
+    # sense ningú que els faci servir, els esdeveniments de lliurament només alentirien la simulació
+    deliveries = on_event is not None or use_events is not None
+    containers = iter(containers)
+    c = next(containers, None)
+    if c is not None:
+        events.push(c.arrival_start, ARRIVAL, c)
+    while events:
+        event = events.pop()
+        if event.kind != ARRIVAL:
+            if on_event is not None:
+                on_event(event)
+            continue
+        c = next(containers, None)
+        if c is not None:
+            events.push(c.arrival_start, ARRIVAL, c)
+        if deliveries:
+            events.schedule(event.container)
+        strategy.exec(event.container)
+
+
+def run_strategy(strategy, containers_path: str) -> None:
+    """Drives a strategy with the containers of a file at path (see simulate) and closes it,
+    also if it raises: the actions logged before an error are written too."""
+
+    try:
+        simulate(strategy, iter_containers(containers_path))
+    finally:
+        strategy.close()
+
+
+def replay(store: Store, time: TimeStamp, what: str, args: Tuple[int, ...], containers: Callable[[int], Container]) -> None:
+    """
+    Applies to the store an action of a log at a certain time. containers gives the container of each identifier.
+    Raise an exception if the action is not legal.
+    """
+
+    if what == "CASH":
+        cash = args[0]
+        assert cash == store.cash(), "The cash does not match the cash made."
+
+    elif what == "ADD":
+        identifier, position = args
+        store.add(containers(identifier), position)
+
+    elif what == "REMOVE":
+        identifier = args[0]
+        container = store.find(identifier) or containers(identifier)
+        store.remove(container)
+        if container.delivery_start <= time < container.delivery_end:
+            store.add_cash(container.value)
+
+    elif what == "MOVE":
+        identifier, position = args
+        store.move(store.find(identifier) or containers(identifier), position)
+
+    elif what == "SNAPSHOT":
+        assert args[0] == store.cash(), "The cash does not match the snapshot."
+        assert args[1:] == tuple(x for placement in store.placements() for x in placement), \
+            "The store does not match the snapshot."
+
+    else:
+        assert False, "Unknown action."
+
+
+def snapshot_store(width: int, args: Tuple[int, ...], containers: Callable[[int], Container]) -> Store:
+    """Returns a store of a certain width in the state saved in the arguments of a SNAPSHOT record."""
+
+    store = Store(width)
+    store.add_cash(args[0])
+    for i in range(1, len(args), 2):
+        store.add(containers(args[i]), args[i + 1])
+    return store
+
+
+# First illegal action found in a log.
+class LogError(Exception):
+
+    """Exception raised by validate_log (and by LogReader for a record it cannot read)."""
+
+    line: int                                       # line of the action (the START line is line 1)
+    time: TimeStamp                                 # time of the action
+    message: str                                    # what is wrong with the action
+
+    def __init__(self, line: int, time: TimeStamp, message: str):
+        super().__init__(f'line {line}, t: {time}: {message}')
+        self.line = line
+        self.time = time
+        self.message = message
+
+    def __reduce__(self):
+        return LogError, (self.line, self.time, self.message)
+
+
+# Valida cada acció a mesura que l'estratègia la registra, sobre una rèplica del
+# magatzem, en lloc de tornar a llegir el registre un cop acabada l'execució.
+class ShadowValidator:
+
+    """Sink for a Logger that raises a LogError as soon as an illegal action is logged."""
+
+    _store: Store                                   # replica of the store
+    _last: TimeStamp                                # time of the last action
+    _line: int                                      # line of the last action in the log
+
+    def __init__(self, width: int):
+        self._store = Store(width)
+        self._last = 0
+        self._line = 1
+
+    def cash(self) -> int:
+        """Returns the cash made according to the actions logged so far."""
+
+        return self._store.cash()
+
+    def record(self, t: TimeStamp, what: str, args: Tuple[int, ...], c: Optional[Container]) -> None:
+        # the Logger writes every record in a line of its own, so the records counted are the lines of the log
+        self._line += 1
+        try:
+            assert t >= self._last, "Time goes backwards."
+            replay(self._store, t, what, args, lambda identifier: c)
+        except (AssertionError, ValueError, KeyError, IndexError) as error:
+            raise LogError(self._line, t, f'{what} {" ".join(map(str, args[:4]))}: {error!r}') from error
+        self._last = t
+
+
+def validate_log(containers_path: str, log_path: str) -> int:
+    """
+    Check that the actions stored in the log at log_path with the containers at containers_path are legal,
+    without showing them. The log is read as a stream, so it can be arbitrarily long.
+    Raise a LogError with the first illegal action if not. Return the cash made.
+    """
+
+    return _validate_segment(read_container_columns(containers_path), log_path, None, None, 2)
+
+
+def _validate_segment(containers: ContainerColumns, log_path: str, start: Optional[int], end: Optional[int],
+                      line: int) -> int:
+    """Validates the records of a log from the one at offset start to the one at offset end and returns the
+    cash made. If start is given, it is a SNAPSHOT record the store is rebuilt from. line is the line of the
+    first record."""
+
+    with LogReader(log_path) as log:
+        store, last = Store(log.width), 0
+        # a record that cannot be read raises a LogError in records
+        for i, (line, time, what, args) in enumerate(log.records(start, end, line)):
+            try:
+                assert time >= last, "Time goes backwards."
+                if i == 0 and start is not None:
+                    assert what == "SNAPSHOT", "A segment should start with a snapshot."
+                    store = snapshot_store(log.width, args, containers.find)
+                else:
+                    replay(store, time, what, args, containers.find)
+            except (AssertionError, ValueError, KeyError, IndexError) as error:
+                raise LogError(line, time, f'{what} {" ".join(map(str, args[:4]))}: {error!r}') from error
+            last = time
+    return store.cash()
+
+
+# containers of the probe in each process of validate_log_parallel
+_worker_containers: Optional[ContainerColumns] = None
+
+
+def _init_worker(containers_path: str) -> None:
+    global _worker_containers
+    _worker_containers = read_container_columns(containers_path)
+
+
+def _validate_worker(log_path: str, start: Optional[int], end: Optional[int], line: int) -> int:
+    return _validate_segment(_worker_containers, log_path, start, end, line)
+
+
+def validate_log_parallel(containers_path: str, log_path: str, processes: Optional[int] = None) -> int:
+    """
+    Like validate_log, but the log is split at its SNAPSHOT records and the segments are validated in
+    a pool of processes. Each segment starts from the store saved in a snapshot and has to end in the
+    state saved in the next one.
+    Raise a LogError with the first illegal action if not. Return the cash made.
+    """
+
+    with LogReader(log_path) as log:
+        snapshots = log.snapshots()
+    if not snapshots:
+        return validate_log(containers_path, log_path)
+
+    segments = [(None, snapshots[0][0], 2)]
+    for i, (offset, line) in enumerate(snapshots):
+        segments.append((offset, snapshots[i + 1][0] if i + 1 < len(snapshots) else None, line))
+
+    with ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(containers_path,)) as pool:
+        futures = [pool.submit(_validate_worker, log_path, *segment) for segment in segments]
+        errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        raise min(errors, key=lambda error: error.line if isinstance(error, LogError) else 0)
+    return futures[-1].result()
+
+
+def check_and_show(containers_path: str, log_path: str, stdscr: Optional[curses.window] = None,
+                   speed: Optional[float] = 20.0, every: int = 1, interval: Optional[float] = None):
     """
     Check that the actions stored in the log at log_path with the containers at containers_path are legal.
     Raise an exception if not.
-    In the case that stdscr is not None, the store is written after each action.
+    In the case that stdscr is not None, the store is shown at speed actions per second (as fast as
+    possible if it is None), drawing a frame every every actions or every interval seconds (see Renderer).
     """
 
     # get the data
     containers_list = read_containers(containers_path)
     containers_map = {c.identifier: c for c in containers_list}
-    log = open(log_path, 'r')
-    lines = log.readlines()
-
-    # process first line
-    tokens = lines[0].split()
-    assert len(tokens) == 4
-    assert tokens[0] == "0"
-    assert tokens[1] == "START"
-    name = tokens[2]
-    width = int(tokens[3])
-    last = 0
-    store = Store(width)
-    if stdscr:
-        store.write(stdscr)
-
-    # process remaining lines
-    for line in lines[1:]:
-        tokens = line.split()
-        time = int(tokens[0])
-        what = tokens[1]
-        assert time >= last
-        last = time
-
-        if what == "CASH":
-            cash = int(tokens[2])
-            assert cash == store.cash()
-
-        elif what == "ADD":
-            identifier, position = int(tokens[2]), int(tokens[3])
-            store.add(containers_map[identifier], position)
-
-        elif what == "REMOVE":
-            identifier = int(tokens[2])
-            container = containers_map[identifier]
-            store.remove(container)
-            if container.delivery.start <= time < container.delivery.end:
-                store.add_cash(container.value)
-
-        elif what == "MOVE":
-            identifier, position = int(tokens[2]), int(tokens[3])
-            store.move(containers_map[identifier], position)
+    with LogReader(log_path) as log:
 
-        else:
-            assert False
+        # process first line
+        name = log.name
+        width = log.width
+        last = 0
+        store = Store(width)
+        renderer = Renderer(stdscr, store, speed, every, interval) if stdscr else None
+
+        # process remaining lines
+        for time, what, args in log:
+            assert time >= last
+            last = time
+
+            replay(store, time, what, args, containers_map.__getitem__)
+
+            if renderer:
+                renderer.action(f'{name} t: {time}')
 
-        if stdscr:
-            store.write(stdscr, f'{name} t: {time}')
+        if renderer:
+            renderer.finish(f'{name} t: {last}')
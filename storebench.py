@@ -0,0 +1,163 @@
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from store import *
+from bench import write_report
+
+
+def fill_store(width: int, n: int, rng: random.Random) -> Tuple[Store, List[Container]]:
+    """Returns a store of a certain width with n containers of random sizes and delivery times,
+    laid in full rows from left to right, and the list of its containers."""
+
+    store = Store(width)
+    containers = []  # type: List[Container]
+    p = 0
+    for identifier in range(n):
+        size = min(rng.randint(1, MAX_SIZE), width - p)
+        delivery = rng.randint(0, 10 * n)
+        c = Container(identifier, size, rng.randint(0, 100), TimeRange(0, 1), TimeRange(delivery, delivery + 10))
+        store.add(c, p)
+        containers.append(c)
+        p = 0 if p + size == width else p + size
+    return store, containers
+
+
+def operations(store: Store, containers: List[Container], k: int, rng: random.Random) \
+        -> Dict[str, Callable[[], None]]:
+    """Returns, for each operation, a function that runs it k times on the store and leaves it as it was."""
+
+    width = store.width()
+    n = len(containers)
+    new = [Container(n + i, 1, 0, TimeRange(0, 1), TimeRange(i, i + 10)) for i in range(k)]
+    probes = [Container(n + k + i, rng.randint(1, MAX_SIZE), 0, TimeRange(0, 1), TimeRange(i, i + 10)) for i in range(k)]
+    columns = [rng.randrange(width) for i in range(k)]
+    positions = [rng.randrange(width - c.size + 1) for c in probes]
+    picked = [rng.choice(containers) for i in range(k)]
+    # the container moved is left where it started: k is even
+    moving = new[0]
+
+    def add():
+        for c, p in zip(new, columns):
+            store.add(c, p)
+
+    def remove():
+        for c in reversed(new):
+            store.remove(c)
+
+    def move():
+        for p in columns:
+            store.move(moving, p)
+
+    def move_height():
+        for p in columns:
+            store.move(moving, p)
+            store.height()
+
+    def move_leftmost():
+        for p in columns:
+            store.move(moving, p)
+            store.leftmost_position(moving.size)
+
+    def can_add():
+        for c, p in zip(probes, positions):
+            store.can_add(c, p)
+
+    def can_remove():
+        for c in picked:
+            store.can_remove(c)
+
+    def height():
+        for i in range(k):
+            store.height()
+
+    def removable_containers():
+        for i in range(k):
+            store.removable_containers()
+
+    def location():
+        for c in picked:
+            store.location(c)
+
+    def first_container():
+        for i in range(k):
+            store.first_container()
+
+    def setup_move():
+        store.add(moving, columns[-1])
+
+    def teardown_move():
+        store.remove(moving)
+
+    return {'add': add, 'remove': remove, 'setup_move': setup_move, 'move': move, 'move+height': move_height,
+            'move+leftmost': move_leftmost, 'teardown_move': teardown_move,
+            'can_add': can_add, 'can_remove': can_remove, 'height': height,
+            'removable_containers': removable_containers, 'location': location, 'first_container': first_container}
+
+
+def measure(width: int, n: int, k: int = 1000, repeat: int = 5, seed: int = 0) -> List[Dict[str, Union[str, int, float]]]:
+    """
+    Measures every operation on a store of a certain width holding n containers: the best time
+    of repeat batches of k calls, and the memory allocated during a batch (traced with tracemalloc
+    on a separate batch): the peak over the store before the batch and what is still held after it.
+    The placement tree of the store is brought up to date before each batch, so the lazy update of
+    the columns changed is only paid by move+leftmost, where each move is followed by a query.
+    """
+
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    store, containers = fill_store(width, n, rng)
+    build = time.perf_counter() - start
+    ops = operations(store, containers, k, rng)
+
+    times = {}  # type: Dict[str, float]
+    for r in range(repeat + 1):  # the last batch is traced
+        traced = r == repeat
+        for name, op in ops.items():
+            store.leftmost_position(1)
+            if traced and not name.startswith(('setup', 'teardown')):
+                tracemalloc.start()
+                before = tracemalloc.get_traced_memory()[0]
+                op()
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                times[name + ':peak'] = peak - before
+                times[name + ':held'] = current - before
+            else:
+                start = time.perf_counter()
+                op()
+                times[name] = min(times.get(name, float('inf')), time.perf_counter() - start)
+
+    return [{'operation': name, 'width': width, 'containers': n, 'height': store.height(), 'build_seconds': build,
+             'ns_per_call': times[name] / k * 1e9, 'peak_bytes': times[name + ':peak'],
+             'held_bytes_per_call': times[name + ':held'] / k}
+            for name in ops if not name.startswith(('setup', 'teardown'))]
+
+
+# per mesurar les operacions del magatzem: fitxer de l'informe (.json o .csv) i,
+# opcionalment, les amplades i els nombres de contenidors.
+def main():
+    """main script"""
+
+    parser = argparse.ArgumentParser(description="Measures the operations of a Store.")
+    parser.add_argument('report', help="report file (.json or .csv)")
+    parser.add_argument('--widths', type=int, nargs='+', default=[20, 100, 1000, 10000])
+    parser.add_argument('--containers', type=int, nargs='+', default=[100, 1000, 10000, 100000, 1000000])
+    parser.add_argument('--calls', type=int, default=1000, help="calls per batch (default 1000)")
+    parser.add_argument('--repeat', type=int, default=5, help="batches timed per operation (default 5)")
+    args = parser.parse_args()
+
+    results = []  # type: List[Dict[str, Union[str, int, float]]]
+    for width in args.widths:
+        for n in args.containers:
+            rows = measure(width, n, args.calls + args.calls % 2, args.repeat)
+            results.extend(rows)
+            print(width, n, ' '.join(f"{row['operation']}={row['ns_per_call']:.0f}ns" for row in rows), file=sys.stderr)
+    write_report(results, args.report)
+
+
+# start main script when program executed
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import sys
+
+from store import *
+
+
+# per validar un registre sense visualitzar-lo: nom de fitxer dels contenidors (probes),
+# nom del fitxer amb les accions registrades i, opcionalment, nombre de processos per
+# validar-lo en paral·lel (si el registre té SNAPSHOTs).
+# Amb només el fitxer dels contenidors, es validen els contenidors.
+def main():
+    """main script"""
+
+    containers_path = sys.argv[1]
+    try:
+        columns = check_containers(containers_path)
+    except ProbeError as error:
+        print(error)
+        sys.exit(1)
+    if len(sys.argv) == 2:
+        print('OK', len(columns))
+        return
+
+    log_path = sys.argv[2]
+    try:
+        if len(sys.argv) > 3:
+            cash = validate_log_parallel(containers_path, log_path, int(sys.argv[3]))
+        else:
+            cash = validate_log(containers_path, log_path)
+    except LogError as error:
+        print(error)
+        sys.exit(1)
+    print('OK', cash)
+
+
+# start main script when program executed
+if __name__ == '__main__':
+    main()